@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_environment():
+    """Кэши тестов во временном каталоге, а не в общем кэше сервера.
+
+    Миниатюры не создаются в фоне: потоки пишут в MEDIA_ROOT, который
+    фикстуры удаляют сразу после теста.
+    """
+    from django.test.utils import override_settings
+
+    from core.cache import isolated_caches
+
+    with isolated_caches(), override_settings(THUMBNAIL_PREGENERATE=False):
+        yield
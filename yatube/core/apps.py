@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import connections  # noqa: F401
+        from . import slow_queries
+        if settings.SLOW_QUERY_MS:
+            connection_created.connect(slow_queries.instrument_connection)
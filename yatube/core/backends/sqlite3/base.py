@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с PRAGMA из settings.SQLITE_PRAGMAS и транзакциями
+    BEGIN IMMEDIATE по запросу.
+
+    Отложенный BEGIN берёт блокировку записи только на первом изменении,
+    и если другой писатель успел раньше, SQLite сразу возвращает
+    SQLITE_BUSY, не дожидаясь busy_timeout. Код, который знает, что
+    будет писать (core.sqlite.retry_on_busy), включает
+    immediate_transactions.
+    """
+    immediate_transactions = False
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(
+            'BEGIN IMMEDIATE' if self.immediate_transactions else 'BEGIN'
+        )
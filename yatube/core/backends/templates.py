@@ -0,0 +1,39 @@
+import time
+from contextvars import ContextVar
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+from django.template.backends.django import reraise
+
+from core import metrics
+
+# Отрисовки внутри отрисовки (карточки постов на странице) уже входят
+# во время внешнего шаблона; учитывается только внешний
+_rendering = ContextVar('template_rendering', default=False)
+
+
+class Template(DjangoTemplate):
+    def render(self, context=None, request=None):
+        if _rendering.get():
+            return super().render(context, request)
+        token = _rendering.set(True)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _rendering.reset(token)
+            metrics.add('template', time.perf_counter() - started)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django с учётом времени отрисовки в core.metrics."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
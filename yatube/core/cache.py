@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+# Попадания и промахи кэша в текущем процессе
+stats = Counter()
+
+MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи get/get_many в stats и в замере
+запроса core.metrics.
+
+    Если бэкенд выполняет get_many через get (как BaseCache), ключи
+    учитываются в get; native_get_many включает подсчёт в get_many.
+    """
+    native_get_many = False
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version=version)
+        if value is MISSING:
+            stats['misses'] += 1
+            metrics.add('cache_misses')
+            return default
+        stats['hits'] += 1
+        metrics.add('cache_hits')
+        return value
+
+    def get_many(self, keys, version=None):
+        values = super().get_many(keys, version=version)
+        if self.native_get_many:
+            stats['hits'] += len(values)
+            stats['misses'] += len(keys) - len(values)
+            metrics.add('cache_hits', len(values))
+            metrics.add('cache_misses', len(keys) - len(values))
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedFileBasedCache(InstrumentedCacheMixin, FileBasedCache):
+    pass
+
+
+@contextmanager
+def isolated_caches():
+    """Кэши с теми же бэкендами, но в своём временном каталоге.
+
+    Для тестов и замеров: общий файловый кэш сервера не читается,
+    не заполняется данными временной базы и не очищается. Процессы,
+    запущенные внутри блока через fork, делят этот каталог.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube_cache_')
+    isolated = {}
+    for alias, config in settings.CACHES.items():
+        config = dict(config)
+        backend = import_string(config['BACKEND'])
+        if issubclass(backend, FileBasedCache):
+            config['LOCATION'] = os.path.join(directory, alias)
+        elif issubclass(backend, LocMemCache):
+            config['LOCATION'] = f'{directory}:{alias}'
+        isolated[alias] = config
+    try:
+        with override_settings(CACHES=isolated):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,54 @@
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Счётчики одного процесса-воркера
+stats = Counter()
+opened_at = {}
+
+
+@receiver(connection_created)
+def count_open(sender, connection, **kwargs):
+    stats['opens'] += 1
+    opened_at[connection.alias] = time.monotonic()
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    """Проверяет оставшиеся с прошлых запросов соединения.
+
+    Просроченные по CONN_MAX_AGE уже закрыл close_old_connections;
+    остальные при CONN_HEALTH_CHECKS проверяются запросом и закрываются,
+    если база их больше не принимает. Соединения внутри внешней
+    транзакции (тесты) не трогаются.
+    """
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if settings.CONN_HEALTH_CHECKS and not connection.is_usable():
+            stats['health_check_failures'] += 1
+            connection.close()
+            continue
+        stats['reuses'] += 1
+
+
+def metrics():
+    now = time.monotonic()
+    return {
+        'pid': os.getpid(),
+        'opens': stats['opens'],
+        'reuses': stats['reuses'],
+        'health_check_failures': stats['health_check_failures'],
+        'age_seconds': {
+            connection.alias: round(now - opened_at[connection.alias], 3)
+            for connection in connections.all()
+            if connection.connection is not None
+            and connection.alias in opened_at
+        },
+    }
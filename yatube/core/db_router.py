@@ -0,0 +1,107 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# Реплики — снимки основной базы: сессии и пользователи в них отстают,
+# и вошедший после снимка выглядел бы гостем. С реплик читаются только
+# данные ленты.
+REPLICATED_APPS = {'posts'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# ContextVar, а не threading.local: значение не переживает запрос,
+# даже если поток обслуживает несколько запросов по очереди
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replicas():
+    return settings.DATABASE_REPLICAS
+
+
+@contextmanager
+def reading_from_replicas():
+    """Внутри блока чтения уходят на реплики, запись — на основную базу."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def pinned_to_primary(request):
+    """Пользователь недавно писал: читаем с основной базы, где уже
+    есть его изменения."""
+    try:
+        return float(
+            request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0)
+        ) > time.time()
+    except ValueError:
+        return False
+
+
+def reads_from_primary(request):
+    return (
+        not replicas()
+        or request.method not in SAFE_METHODS
+        or pinned_to_primary(request)
+    )
+
+
+def replica_reads(view):
+    """Декоратор представлений, которые только читают данные."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if reads_from_primary(request):
+            return view(request, *args, **kwargs)
+        with reading_from_replicas():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтение моделей REPLICATED_APPS в представлениях с replica_reads —
+    со случайной реплики из settings.DATABASE_REPLICAS, всё остальное —
+    с основной базы."""
+
+    def db_for_read(self, model, **hints):
+        if (
+            _replica_reads.get()
+            and replicas()
+            and model._meta.app_label in REPLICATED_APPS
+        ):
+            return random.choice(replicas())
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
+
+
+class PinToPrimaryMiddleware:
+    """После запроса на запись на REPLICA_PIN_SECONDS ставит cookie,
+    по которой чтения этого клиента идут на основную базу."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if replicas() and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,87 @@
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from core import cache as instrumented
+
+
+def create_cache(config):
+    params = dict(config)
+    backend = import_string(params.pop('BACKEND'))
+    return backend(params.pop('LOCATION', ''), params)
+
+
+def run_worker(args):
+    """Имитирует процесс gunicorn: читает горячие ключи, на промах пишет."""
+    config, requests, keys, seed = args
+    cache = create_cache(config)
+    rng = random.Random(seed)
+    instrumented.stats.clear()
+    started = time.perf_counter()
+    for _ in range(requests):
+        # Скошенное распределение: популярные страницы и длинный хвост
+        key = f'page:{int(keys * rng.random() ** 3)}'
+        if cache.get(key) is None:
+            cache.set(key, 'x' * 2048, timeout=300)
+    elapsed = time.perf_counter() - started
+    return (
+        instrumented.stats['hits'],
+        instrumented.stats['misses'],
+        elapsed,
+    )
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает долю попаданий в кэш на процесс для бэкендов '
+            'из settings.CACHE_BACKENDS под многопроцессной нагрузкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--keys', type=int, default=500)
+        parser.add_argument(
+            '--backend',
+            action='append',
+            choices=sorted(settings.CACHE_BACKENDS),
+            help='Можно указать несколько раз; по умолчанию все.',
+        )
+
+    def bench(self, name, options):
+        config = dict(settings.CACHE_BACKENDS[name])
+        location = None
+        if 'LOCATION' in config:
+            location = tempfile.mkdtemp(prefix='yatube_bench_cache_')
+            config['LOCATION'] = location
+        jobs = [
+            (config, options['requests'], options['keys'], seed)
+            for seed in range(options['workers'])
+        ]
+        try:
+            with multiprocessing.Pool(options['workers']) as pool:
+                results = pool.map(run_worker, jobs)
+        finally:
+            if location:
+                shutil.rmtree(location, ignore_errors=True)
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        total_hits = total_misses = 0
+        for number, (hits, misses, elapsed) in enumerate(results, start=1):
+            total_hits += hits
+            total_misses += misses
+            self.stdout.write(
+                f'  процесс {number}: попаданий {hits / (hits + misses):.1%}'
+                f', {(hits + misses) / elapsed:.0f} обращений/с'
+            )
+        self.stdout.write(
+            f'  всего: попаданий '
+            f'{total_hits / (total_hits + total_misses):.1%}'
+        )
+
+    def handle(self, *args, **options):
+        for name in options['backend'] or sorted(settings.CACHE_BACKENDS):
+            self.bench(name, options)
@@ -0,0 +1,77 @@
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+
+from core import connections as connection_stats
+from posts.seed import scratch_database, seed_site
+
+
+def call(handler, path):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+    setup_testing_defaults(environ)
+    response = handler(environ, lambda status, headers: None)
+    try:
+        return b''.join(response)
+    finally:
+        # Как у WSGI-сервера: close() шлёт request_finished
+        response.close()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает обработку posts:index через WSGIHandler с новым '
+            'соединением на каждый запрос и с постоянным соединением.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--max-age', type=int, default=60)
+
+    def bench(self, handler, path, max_age, requests):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        call(handler, path)
+        connection_stats.stats.clear()
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            call(handler, path)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        return {
+            'mean': sum(latencies) / requests,
+            'p50': latencies[requests // 2],
+            'opens': connection_stats.stats['opens'],
+            'reuses': connection_stats.stats['reuses'],
+        }
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        with scratch_database():
+            seed_site(users=20, groups=3, posts=200, comments=200,
+                      follows=50)
+            handler = WSGIHandler()
+            path = reverse('posts:posts_main')
+            results = {}
+            for label, max_age in (
+                ('CONN_MAX_AGE=0', 0),
+                (f'CONN_MAX_AGE={options["max_age"]}', options['max_age']),
+            ):
+                results[label] = self.bench(
+                    handler, path, max_age, requests
+                )
+                result = results[label]
+                self.stdout.write(
+                    f'{label:<18} среднее {result["mean"] * 1000:.2f} мс, '
+                    f'p50 {result["p50"] * 1000:.2f} мс, '
+                    f'открыто соединений {result["opens"]}, '
+                    f'повторно использовано {result["reuses"]}'
+                )
+        fresh, persistent = results.values()
+        self.stdout.write(self.style.SUCCESS(
+            f'Открытие соединения стоило '
+            f'{(fresh["mean"] - persistent["mean"]) * 1000:.2f} мс '
+            f'на запрос'
+        ))
@@ -0,0 +1,81 @@
+import glob
+import json
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Списки IN (%s, %s, ...) разной длины — один и тот же запрос
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def fingerprint(sql):
+    return PLACEHOLDER_LIST.sub('%s, ...', ' '.join(sql.split()))
+
+
+def read_entries(path):
+    # Сначала старые файлы ротации: .5, .4, ... .1, затем текущий
+    paths = sorted(glob.glob(f'{path}.[0-9]*'), reverse=True,
+                   key=lambda name: int(name.rsplit('.', 1)[1]))
+    for name in paths + glob.glob(path):
+        with open(name, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries):
+    groups = defaultdict(lambda: {
+        'count': 0, 'total_ms': 0, 'max_ms': 0, 'origins': Counter(),
+    })
+    for entry in entries:
+        group = groups[fingerprint(entry['sql'])]
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['slowest'] = entry
+        group['origins'][entry.get('origin')] += 1
+    return groups
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: самые дорогие запросы, '
+            'откуда они выполняются и их план.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None,
+                            help='По умолчанию settings.SLOW_QUERY_LOG.')
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument(
+            '--sort', choices=('total', 'count', 'max'), default='total',
+        )
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        if not glob.glob(f'{path}*'):
+            raise CommandError(f'Журнал {path} не найден')
+        groups = summarize(read_entries(path))
+        key = {'total': 'total_ms', 'count': 'count', 'max': 'max_ms'}
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1][key[options['sort']]],
+            reverse=True,
+        )[:options['top']]
+        for number, (sql, group) in enumerate(ranked, 1):
+            slowest = group['slowest']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{number}. {group["count"]} раз, всего '
+                f'{group["total_ms"]:.0f} мс, среднее '
+                f'{group["total_ms"] / group["count"]:.1f} мс, максимум '
+                f'{group["max_ms"]:.1f} мс'
+            ))
+            self.stdout.write(f'   {sql}')
+            for origin, count in group['origins'].most_common(3):
+                self.stdout.write(f'   из {origin} ({count})')
+            for step in slowest.get('plan') or ():
+                self.stdout.write(f'   план: {step}')
+            if slowest.get('params'):
+                self.stdout.write(f'   параметры: {slowest["params"]}')
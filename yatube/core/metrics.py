@@ -0,0 +1,173 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections as db_connections
+from django.db.backends.signals import connection_created
+
+from . import connections
+
+# Замеры обрабатываемого запроса; None вне RequestMetricsMiddleware
+_sample = ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'request_duration_seconds': ('total', DURATION_BUCKETS,
+                                 'Время обработки запроса.'),
+    'db_duration_seconds': ('db', DURATION_BUCKETS,
+                            'Время SQL-запросов за запрос.'),
+    'template_duration_seconds': ('template', DURATION_BUCKETS,
+                                  'Время отрисовки шаблонов за запрос.'),
+    'db_queries': ('queries', QUERY_BUCKETS, 'SQL-запросов за запрос.'),
+}
+COUNTERS = {
+    'cache_hits_total': ('cache_hits', 'Попаданий в кэш.'),
+    'cache_misses_total': ('cache_misses', 'Промахов кэша.'),
+}
+
+
+def add(name, amount=1):
+    """Добавляет к замеру текущего запроса, если он измеряется."""
+    sample = _sample.get()
+    if sample is not None:
+        sample[name] += amount
+
+
+def timed_query(execute, sql, params, many, context):
+    if _sample.get() is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        add('db', time.perf_counter() - started)
+        add('queries')
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if timed_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_query)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Гистограммы и счётчики по имени URL в текущем процессе."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.histograms = defaultdict(dict)
+        self.counters = defaultdict(Counter)
+
+    def observe(self, view, sample):
+        with self.lock:
+            histograms = self.histograms[view]
+            for metric, (name, buckets, _) in HISTOGRAMS.items():
+                if metric not in histograms:
+                    histograms[metric] = Histogram(buckets)
+                histograms[metric].observe(sample[name])
+            for metric, (name, _) in COUNTERS.items():
+                self.counters[view][metric] += sample[name]
+
+    def exposition(self):
+        """Текст в формате Prometheus."""
+        lines = []
+        with self.lock:
+            for metric, (_, buckets, help_text) in HISTOGRAMS.items():
+                lines += [f'# HELP yatube_{metric} {help_text}',
+                          f'# TYPE yatube_{metric} histogram']
+                for view, histograms in sorted(self.histograms.items()):
+                    histogram = histograms[metric]
+                    cumulative = 0
+                    for bound, count in zip(
+                        (*buckets, '+Inf'), histogram.counts
+                    ):
+                        cumulative += count
+                        lines.append(
+                            f'yatube_{metric}_bucket'
+                            f'{{view="{view}",le="{bound}"}} {cumulative}'
+                        )
+                    lines += [
+                        f'yatube_{metric}_sum{{view="{view}"}} '
+                        f'{histogram.sum:.6f}',
+                        f'yatube_{metric}_count{{view="{view}"}} '
+                        f'{cumulative}',
+                    ]
+            for metric, (_, help_text) in COUNTERS.items():
+                lines += [f'# HELP yatube_{metric} {help_text}',
+                          f'# TYPE yatube_{metric} counter']
+                for view, counters in sorted(self.counters.items()):
+                    lines.append(
+                        f'yatube_{metric}{{view="{view}"}} '
+                        f'{counters[metric]}'
+                    )
+        for name in ('opens', 'reuses', 'health_check_failures'):
+            lines += [f'# TYPE yatube_db_connection_{name}_total counter',
+                      f'yatube_db_connection_{name}_total '
+                      f'{connections.stats[name]}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def server_timing(sample):
+    return ', '.join((
+        f'db;dur={sample["db"] * 1000:.1f};desc="{sample["queries"]} SQL"',
+        f'tpl;dur={sample["template"] * 1000:.1f}',
+        f'cache;desc="hit {sample["cache_hits"]}, '
+        f'miss {sample["cache_misses"]}"',
+        f'total;dur={sample["total"] * 1000:.1f}',
+    ))
+
+
+class RequestMetricsMiddleware:
+    """Замеряет запросы: число и время SQL, отрисовку шаблонов, кэш.
+
+    Итог идёт в заголовок Server-Timing и в гистограммы registry по
+    имени URL. При REQUEST_METRICS = False Django исключает
+    middleware из цепочки, а SQL-запросы не оборачиваются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(instrument_connection)
+        for connection in db_connections.all():
+            instrument_connection(None, connection)
+
+    def __call__(self, request):
+        sample = Counter()
+        token = _sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _sample.reset(token)
+        sample['total'] = time.perf_counter() - started
+        match = request.resolver_match
+        registry.observe(match.view_name if match else 'unresolved', sample)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = server_timing(sample)
+        return response
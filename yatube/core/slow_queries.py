@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import time
+import traceback
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger('yatube.slow_queries')
+
+# Запрос EXPLAIN сам проходит через обёртку курсора
+_explaining = ContextVar('explaining', default=False)
+
+MAX_PARAM_LENGTH = 200
+STACK_DEPTH = 5
+
+
+def project_stack():
+    """Кадры кода проекта, ближайший к запросу — последний."""
+    here = os.path.abspath(__file__)
+    frames = []
+    for frame in traceback.extract_stack()[:-1]:
+        filename = os.path.abspath(frame.filename)
+        if (
+            filename == here
+            or not filename.startswith(settings.BASE_DIR + os.sep)
+        ):
+            continue
+        path = os.path.relpath(filename, settings.BASE_DIR)
+        frames.append(f'{path}:{frame.lineno} in {frame.name}')
+    return frames[-STACK_DEPTH:]
+
+
+def loggable(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    value = str(value)
+    if len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + '…'
+    return value
+
+
+def explain(connection, sql, params):
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    else:
+        prefix = connection.ops.explain_query_prefix()
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    finally:
+        _explaining.reset(token)
+    if connection.vendor == 'sqlite':
+        # id, parent, notused, detail
+        return [row[-1] for row in rows]
+    return [' '.join(str(column) for column in row) for row in rows]
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """Обёртка курсора: пишет запросы дольше SLOW_QUERY_MS в журнал."""
+    if _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started) * 1000
+    if duration < settings.SLOW_QUERY_MS:
+        return result
+    connection = context['connection']
+    stack = project_stack()
+    entry = {
+        'duration_ms': round(duration, 3),
+        'database': connection.alias,
+        'sql': sql,
+        'params': None if many else [loggable(value)
+                                     for value in params or ()],
+        'many': many,
+        'origin': stack[-1] if stack else None,
+        'stack': stack,
+        'plan': None,
+    }
+    if (
+        settings.SLOW_QUERY_EXPLAIN
+        and not many
+        and sql.lstrip()[:6].upper() == 'SELECT'
+    ):
+        entry['plan'] = explain(connection, sql, params)
+    logger.warning('Медленный запрос %.1f мс: %s', duration, entry['origin'],
+                   extra={'slow_query': entry})
+    return result
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_slow_queries)
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запрос для команды slow_queries."""
+
+    def format(self, record):
+        return json.dumps(
+            {
+                'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+                **getattr(record, 'slow_query', {}),
+            },
+            ensure_ascii=False,
+        )
@@ -0,0 +1,55 @@
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+BUSY_MESSAGES = ('database is locked', 'database is busy')
+
+
+def is_busy(error):
+    return any(message in str(error) for message in BUSY_MESSAGES)
+
+
+def retry_on_busy(write):
+    """Повторяет запись write, если SQLite занята другим писателем.
+
+    Оборачивается сама запись в базу, а не представление: отрисовка
+    формы не держит блокировку, а сохранение загруженных файлов не
+    повторяется. Каждая попытка идёт в своей транзакции BEGIN IMMEDIATE:
+    блокировка записи ждёт busy_timeout, а неудачная попытка не
+    оставляет половину изменений. Паузы растут экспоненциально от
+    SQLITE_BUSY_BACKOFF со случайной добавкой; SQLITE_BUSY_RETRIES = 0
+    отключает обёртку.
+    """
+    @wraps(write)
+    def wrapper(*args, **kwargs):
+        retries = settings.SQLITE_BUSY_RETRIES
+        if (
+            not retries
+            or connection.vendor != 'sqlite'
+            or connection.in_atomic_block
+        ):
+            return write(*args, **kwargs)
+        for attempt in range(retries + 1):
+            connection.immediate_transactions = True
+            try:
+                with transaction.atomic():
+                    connection.immediate_transactions = False
+                    return write(*args, **kwargs)
+            except OperationalError as error:
+                if not is_busy(error) or attempt == retries:
+                    raise
+                delay = settings.SQLITE_BUSY_BACKOFF * 2 ** attempt
+                logger.warning(
+                    'SQLite занята, повтор %s через %.3f с: %s',
+                    attempt + 1, delay, write.__qualname__,
+                )
+                time.sleep(delay * (1 + random.random()))
+            finally:
+                connection.immediate_transactions = False
+    return wrapper
@@ -0,0 +1,28 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from .cache import isolated_caches
+
+
+class IsolatedTestRunner(DiscoverRunner):
+    """Готовит окружение тестов.
+
+    Переносит кэши во временный каталог процесса: общий файловый кэш
+    переживает прогон, а тестовая база начинает id заново. Отключает
+    чтение с реплик: зеркало основной базы — отдельное соединение,
+    и данные из транзакции теста ему не видны.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.isolation = ExitStack()
+        self.isolation.enter_context(isolated_caches())
+        self.replicas = settings.DATABASE_REPLICAS
+        settings.DATABASE_REPLICAS = []
+
+    def teardown_test_environment(self, **kwargs):
+        settings.DATABASE_REPLICAS = self.replicas
+        self.isolation.close()
+        super().teardown_test_environment(**kwargs)
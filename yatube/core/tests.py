@@ -1,6 +1,35 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from itertools import count
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import OperationalError, connection, router
+from django.db import connections as db_connections
+from unittest import mock
+
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.template import engines
+from django.urls import reverse
 
 from http import HTTPStatus
+from io import StringIO
+
+from . import connections, metrics
+from .backends import templates
+from .cache import isolated_caches, stats
+from .db_router import replica_reads
+from .management.commands.slow_queries import fingerprint
+from .sqlite import retry_on_busy
+from posts.models import Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +37,280 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404 page_not_found.html')
+
+
+class InstrumentedCacheTest(TestCase):
+    def test_hits_and_misses_counted(self):
+        """Обращения к кэшу учитываются как попадания и промахи."""
+        cache.clear()
+        stats.clear()
+        cache.get('missing')
+        cache.set('present', 1)
+        cache.get('present')
+        cache.get_many(['present', 'missing'])
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_tests_do_not_share_server_cache(self):
+        """Тесты и замеры пишут в свой временный кэш."""
+        from yatube import settings as project_settings
+
+        shared = project_settings.CACHES['default'].get('LOCATION')
+        self.assertNotEqual(settings.CACHES['default'].get('LOCATION'), shared)
+        cache.set('outer', 1)
+        with isolated_caches():
+            location = settings.CACHES['default'].get('LOCATION')
+            self.assertIsNone(cache.get('outer'))
+            cache.set('inner', 1)
+        self.assertIsNone(cache.get('inner'))
+        self.assertEqual(cache.get('outer'), 1)
+        self.assertFalse(os.path.exists(location))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(TestCase):
+    @staticmethod
+    @replica_reads
+    def read_view(request):
+        return router.db_for_read(Post), router.db_for_write(Post)
+
+    def test_read_views_read_from_replicas(self):
+        """Представления с replica_reads читают с реплик, пишут в основную."""
+        read_db, write_db = self.read_view(RequestFactory().get('/'))
+        self.assertIn(read_db, settings.DATABASE_REPLICAS)
+        self.assertEqual(write_db, 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_users_and_sessions_read_from_primary(self):
+        """Пользователи и сессии не читаются с отстающих реплик."""
+        from django.contrib.sessions.models import Session
+
+        @replica_reads
+        def view(request):
+            return router.db_for_read(User), router.db_for_read(Session)
+
+        self.assertEqual(
+            view(RequestFactory().get('/')), ('default', 'default')
+        )
+
+    def test_unsafe_methods_use_primary(self):
+        """Запросы на запись читают с основной базы."""
+        read_db, _ = self.read_view(RequestFactory().post('/'))
+        self.assertEqual(read_db, 'default')
+
+    def test_write_pins_client_to_primary(self):
+        """После записи клиент какое-то время читает с основной базы."""
+        user = User.objects.create_user(username='writer')
+        self.client.force_login(user)
+        response = self.client.post(
+            '/create/', {'text': 'Новый пост'}
+        )
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        request = RequestFactory().get('/')
+        request.COOKIES = {cookie.key: cookie.value}
+        read_db, _ = self.read_view(request)
+        self.assertEqual(read_db, 'default')
+
+
+class ReplicaViewTest(TransactionTestCase):
+    """Страница ленты с настоящей репликой: файлом, который наполняет
+    sync_replicas. Данные в нём видны только после фиксации, поэтому
+    TransactionTestCase."""
+    alias = 'replica_test'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        db_connections.databases[self.alias] = {
+            **db_connections.databases['default'],
+            'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        self.addCleanup(db_connections.databases.pop, self.alias)
+        self.addCleanup(db_connections[self.alias].close)
+        replicas = override_settings(DATABASE_REPLICAS=[self.alias])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        cache.clear()
+
+    def test_feed_reads_posts_from_replica_and_session_from_primary(self):
+        author = User.objects.create_user(username='replicated')
+        Post.objects.create(author=author, text='Пост из снимка')
+        call_command('sync_replicas', stdout=StringIO())
+        Post.objects.create(author=author, text='Пост после снимка')
+        # Вошёл после снимка: в реплике нет ни его, ни его сессии
+        self.client.force_login(User.objects.create_user(username='late'))
+        response = self.client.get(reverse('posts:posts_main'))
+        self.assertContains(response, 'Пост из снимка')
+        self.assertNotContains(response, 'Пост после снимка')
+        self.assertTrue(response.context['user'].is_authenticated)
+
+
+@override_settings(SQLITE_BUSY_RETRIES=2, SQLITE_BUSY_BACKOFF=0)
+class SQLiteTuningTest(TransactionTestCase):
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0],
+                settings.SQLITE_PRAGMAS['busy_timeout'],
+            )
+
+    def test_busy_write_retried_in_fresh_transaction(self):
+        """Занятая база — повтор, и изменения неудачной попытки откатаны."""
+        attempts = []
+
+        @retry_on_busy
+        def write():
+            User.objects.create_user(username=f'user{len(attempts)}')
+            attempts.append(connection.in_atomic_block)
+            if len(attempts) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        with self.assertLogs('core.sqlite', 'WARNING') as logs:
+            self.assertEqual(write(), 'ok')
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(attempts, [True, True, True])
+        self.assertEqual(
+            list(User.objects.values_list('username', flat=True)),
+            ['user2'],
+        )
+
+    def test_gives_up_after_retries(self):
+        """После SQLITE_BUSY_RETRIES повторов ошибка выходит наружу."""
+        @retry_on_busy
+        def write():
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError), \
+                self.assertLogs('core.sqlite', 'WARNING'):
+            write()
+
+
+class ConnectionHealthTest(TransactionTestCase):
+    def setUp(self):
+        connection.ensure_connection()
+        connections.stats.clear()
+
+    def test_idle_connection_reused(self):
+        """Живое соединение с прошлого запроса используется повторно."""
+        request_started.send(sender=self.__class__)
+        self.assertEqual(connections.stats['reuses'], 1)
+        self.assertIn('default', connections.metrics()['age_seconds'])
+
+    def test_broken_connection_closed(self):
+        """Соединение, не прошедшее проверку, закрывается до запроса."""
+        wrapper = db_connections['default']
+        with mock.patch.object(wrapper, 'is_usable', return_value=False), \
+                mock.patch.object(wrapper, 'close') as close:
+            request_started.send(sender=self.__class__)
+        close.assert_called_once()
+        self.assertEqual(connections.stats['health_check_failures'], 1)
+        self.assertEqual(connections.stats['reuses'], 0)
+
+    def test_metrics_are_staff_only(self):
+        """Метрики соединений видны только персоналу."""
+        url = '/health/db/'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(
+            set(self.client.get(url).json()),
+            {'pid', 'opens', 'reuses', 'health_check_failures',
+             'age_seconds'},
+        )
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        metrics.registry.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит время SQL, шаблонов и кэша в Server-Timing."""
+        timing = self.client.get('/')['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* SQL"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertIn('cache;desc="hit', timing)
+
+    def test_histograms_by_url_name(self):
+        """Гистограммы собираются по имени URL и видны только персоналу."""
+        self.client.get('/')
+        self.client.get('/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        text = self.client.get('/metrics/').content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:posts_main"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:posts_main",le="+Inf"} 2',
+            text,
+        )
+
+    def test_nested_renders_counted_once(self):
+        """Карточки, отрисованные внутри страницы, не учитываются второй
+        раз во времени шаблонов."""
+        engine = engines.all()[0]
+        card = engine.from_string('карточка')
+        page = engine.from_string('{{ card }}')
+        clock = mock.Mock(perf_counter=mock.Mock(side_effect=count()))
+        with mock.patch.object(templates, 'time', clock), \
+                mock.patch.object(metrics, 'add') as add:
+            self.assertEqual(page.render({'card': card.render}), 'карточка')
+        add.assert_called_once_with('template', 1)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled(self):
+        """Выключенные замеры не добавляют заголовков и гистограмм."""
+        response = self.client.get('/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics.registry.histograms, {})
+
+
+class SlowQueryLogTest(TestCase):
+    @override_settings(SLOW_QUERY_MS=1e-6)
+    def test_slow_query_logged_with_plan_and_origin(self):
+        """Медленный запрос пишется с планом, параметрами и местом вызова."""
+        with self.assertLogs('yatube.slow_queries') as logs:
+            User.objects.filter(username='nobody').exists()
+        entry = logs.records[0].slow_query
+        self.assertIn('core/tests.py', entry['origin'])
+        self.assertEqual(entry['params'], ['nobody'])
+        self.assertTrue(any('auth_user' in step for step in entry['plan']))
+
+    @override_settings(SLOW_QUERY_MS=1000)
+    def test_fast_query_not_logged(self):
+        """Быстрые запросы в журнал не попадают."""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('yatube.slow_queries'):
+                User.objects.exists()
+
+    def test_summary_groups_by_query(self):
+        """Сводка объединяет запросы, различающиеся длиной списка IN."""
+        self.assertEqual(
+            fingerprint('SELECT 1 WHERE id IN (%s, %s,  %s)'),
+            fingerprint('SELECT 1 WHERE id IN (%s, %s)'),
+        )
+        entries = [
+            {'sql': 'SELECT a WHERE id IN (%s, %s)', 'duration_ms': 300,
+             'origin': 'posts/views.py:20 in index', 'plan': ['SCAN a']},
+            {'sql': 'SELECT a WHERE id IN (%s, %s, %s)', 'duration_ms': 200,
+             'origin': 'posts/views.py:20 in index', 'plan': ['SCAN a']},
+            {'sql': 'SELECT b', 'duration_ms': 150, 'origin': None,
+             'plan': None},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.log')
+            with open(path, 'w') as log:
+                log.writelines(json.dumps(entry) + '\n' for entry in entries)
+            output = StringIO()
+            call_command('slow_queries', log=path, top=1, stdout=output)
+        output = output.getvalue()
+        self.assertIn('2 раз, всего 500 мс', output)
+        self.assertIn('из posts/views.py:20 in index (2)', output)
+        self.assertIn('план: SCAN a', output)
+        self.assertNotIn('SELECT b', output)
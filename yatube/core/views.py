@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from . import connections, metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404 page_not_found.html',
@@ -16,3 +20,18 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def db_connections(request):
+    """Счётчики соединений с базой в обслужившем запрос процессе."""
+    return JsonResponse(connections.metrics())
+
+
+@staff_member_required
+def request_metrics(request):
+    """Гистограммы запросов процесса в текстовом формате Prometheus."""
+    return HttpResponse(
+        metrics.registry.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
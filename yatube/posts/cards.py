@@ -0,0 +1,65 @@
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+
+TEMPLATE = 'includes/post_card.html'
+
+
+@lru_cache(maxsize=None)
+def template_version():
+    """Новая разметка карточки после выкладки не берёт старые фрагменты."""
+    source = get_template(TEMPLATE).template.source
+    return hashlib.blake2b(source.encode(), digest_size=4).hexdigest()
+
+
+def version(post):
+    """Версия из всех выводимых в карточке полей: изменённый пост
+    получает новый ключ без явной инвалидации."""
+    author = post.author
+    fields = (
+        post.text, post.pub_date.isoformat(), post.image.name,
+        author.username, author.first_name, author.last_name,
+        post.group_id and post.group.slug,
+    )
+    return hashlib.blake2b(
+        repr(fields).encode(), digest_size=8
+    ).hexdigest()
+
+
+def key(post):
+    return f'post-card:{template_version()}:{post.pk}:{version(post)}'
+
+
+def thumbnails_ready(post):
+    return not post.image or all(
+        thumbnails.ready_thumbnail(post.image, geometry, **options)
+        for geometry, options in settings.POST_THUMBNAILS
+    )
+
+
+def render_cards(posts):
+    """HTML карточек постов: готовые берутся из кэша одним get_many,
+    отрисовываются только отсутствующие.
+
+    Карточка не зависит от пользователя, поэтому кэш общий. Пока
+    миниатюра не создана, карточка с исходной картинкой не кэшируется.
+    """
+    keys = {key(post): post for post in posts}
+    cached = cache.get_many(list(keys))
+    template = get_template(TEMPLATE)
+    fresh = {}
+    for card_key, post in keys.items():
+        if card_key in cached:
+            continue
+        cached[card_key] = template.render({'post': post})
+        if thumbnails_ready(post):
+            fresh[card_key] = cached[card_key]
+    if fresh:
+        cache.set_many(fresh, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cached[card_key]) for card_key in keys]
@@ -0,0 +1,156 @@
+"""Условные GET для лент и страницы поста.
+
+ETag складывается из поколений данных versions, зрителя, его
+CSRF-токена и версии шаблонов, Last-Modified — время последней записи
+в те же области versions; и то и другое читается одним обращением к
+кэшу. Last-Modified отправляется только анонимам: страница для
+пользователя зависит не только от времени записи. Совпали с
+присланными клиентом — ответ 304 уходит до запросов страницы и
+отрисовки шаблонов.
+"""
+import hashlib
+import os
+from functools import lru_cache, wraps
+from time import time as now
+
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import versions
+from .models import Group, Post, User
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def templates():
+    for root, dirs, files in sorted(os.walk(settings.TEMPLATES_DIR)):
+        for name in sorted(files):
+            yield name, os.path.join(root, name)
+
+
+@lru_cache(maxsize=None)
+def templates_version():
+    """Хэш шаблонов проекта: после выкладки новой разметки старые
+    ETag не совпадут."""
+    digest = hashlib.blake2b(digest_size=4)
+    for name, path in templates():
+        digest.update(name.encode())
+        with open(path, 'rb') as template:
+            digest.update(template.read())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def templates_modified():
+    return max(int(os.path.getmtime(path)) for name, path in templates())
+
+
+def modified_at(stamp):
+    """Секунда последней записи для Last-Modified.
+
+    Пока эта секунда не прошла, следующая запись попала бы в неё же и
+    не сдвинула бы заголовок — тогда остаётся только ETag.
+    """
+    seconds = stamp // 10 ** 9
+    if seconds >= int(now()):
+        return None
+    return max(seconds, templates_modified())
+
+
+def validators_for(request, *scopes):
+    generation, stamp = versions.state(*scopes)
+    # Шапка страницы своя у каждого пользователя
+    viewer = request.user.pk or 0
+    token = ''
+    if request.user.is_authenticated:
+        # Форма комментария несёт CSRF-токен, а он меняется при входе.
+        # Токен заводится до ETag, чтобы ответ и ETag были с одним.
+        get_token(request)
+        token = request.META['CSRF_COOKIE']
+    value = f'{templates_version()}:{viewer}:{token}:{generation}'
+    etag = hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+    if request.user.is_authenticated:
+        return etag, None
+    return etag, modified_at(stamp)
+
+
+def index(request):
+    return validators_for(request, 'posts')
+
+
+def group_posts(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug
+    ).values_list('pk', flat=True).first()
+    if group_id is None:
+        return None, None
+    return validators_for(request, f'group:{group_id}')
+
+
+def profile(request, username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if author_id is None:
+        return None, None
+    scopes = [f'author:{author_id}']
+    if request.user.is_authenticated:
+        # Кнопка подписки и рекомендации зрителя
+        scopes += [
+            f'follow:{request.user.pk}', f'suggestions:{request.user.pk}'
+        ]
+    return validators_for(request, *scopes)
+
+
+def post_detail(request, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', flat=True).first()
+    if author_id is None:
+        return None, None
+    return validators_for(request, f'post:{post_id}', f'author:{author_id}')
+
+
+def not_modified(request, etag, last_modified):
+    return get_conditional_response(
+        request,
+        etag=etag and quote_etag(etag),
+        last_modified=last_modified,
+    )
+
+
+def with_validators(request, response, etag, last_modified):
+    if response.status_code in (200, 304):
+        if etag:
+            response.setdefault('ETag', quote_etag(etag))
+        if last_modified and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
+        # Страница меняется с любой записью: пусть клиент сверяет
+        # валидаторы каждый раз
+        patch_cache_control(response, no_cache=True)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+    return response
+
+
+def conditional(validators):
+    """Как django.views.decorators.http.condition, но ETag и
+    Last-Modified считает одна функция validators(request, *args,
+    **kwargs).
+
+    Валидаторы (None, None) — объекта нет, ответит само представление.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, *args, **kwargs)
+            response = not_modified(request, etag, last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return with_validators(request, response, etag, last_modified)
+        return wrapper
+    return decorator
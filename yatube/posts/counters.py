@@ -0,0 +1,123 @@
+from django.db import connections, router
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def count_of(queryset, field):
+    """Подзапрос COUNT(*) по queryset, сгруппированному по field."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def user_totals():
+    """Подзапросы счётчиков UserStats для запроса по User."""
+    return {
+        'posts_count': count_of(Post.objects.all(), 'author'),
+        'followers_count': count_of(Follow.objects.all(), 'author'),
+        'following_count': count_of(Follow.objects.all(), 'user'),
+    }
+
+
+def recount(users=None):
+    """Пересчитывает счётчики пользователей users (по умолчанию всех).
+
+    Два запроса на любое число пользователей: UPDATE существующих строк
+    и INSERT … SELECT недостающих, оба с подзапросами COUNT.
+    """
+    users = User.objects.all() if users is None else users
+    totals = user_totals()
+    # UPDATE первым: users может отбирать как раз пользователей без строки
+    updated = UserStats.objects.filter(
+        user__in=users.values('pk')
+    ).update(**totals)
+    missing, params = users.filter(stats__isnull=True).annotate(
+        **{f'{field}_total': total for field, total in totals.items()}
+    ).values_list(
+        'pk', *(f'{field}_total' for field in totals)
+    ).query.sql_with_params()
+    connection = connections[router.db_for_write(UserStats)]
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{UserStats._meta.db_table} (user_id, {", ".join(totals)}) '
+            f'{missing} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params,
+        )
+        return updated + cursor.rowcount
+
+
+def recount_comments():
+    return Post.objects.update(
+        comments_count=count_of(Comment.objects.all(), 'post')
+    )
+
+
+def stats_for(user):
+    """Счётчики user для страницы.
+
+    Строку без записи не создать: представления читают из реплики.
+    Её заводят bump() на первой записи и команда recount, а до тех пор
+    счётчики считаются тем же запросом на чтение.
+    """
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        return UserStats(user=user, **User.objects.filter(
+            pk=user.pk
+        ).values(**user_totals()).get())
+
+
+def shifted(deltas):
+    """Выражения UPDATE для сдвига счётчиков на deltas.
+
+    Счётчик мог разойтись с данными (например, после import_data
+    --no-rebuild): уменьшение останавливается на нуле, не нарушая
+    CHECK >= 0 у PositiveIntegerField.
+    """
+    return {
+        field: F(field) + delta if delta >= 0
+        else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+
+
+def bump(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя: bump(1, posts_count=1)."""
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **shifted(deltas)
+    )
+    # Пропущенную строку создаёт пересчёт; при удалениях строку не
+    # заводим, чтобы не вставлять её удаляемому пользователю.
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        recount(User.objects.filter(pk=user_id))
+
+
+def bump_many(user_ids, **deltas):
+    """bump() для нескольких пользователей одним UPDATE."""
+    updated = UserStats.objects.filter(user_id__in=user_ids).update(
+        **shifted(deltas)
+    )
+    if (
+        updated < len(user_ids)
+        and all(delta > 0 for delta in deltas.values())
+    ):
+        recount(User.objects.filter(pk__in=user_ids, stats__isnull=True))
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        **shifted({'comments_count': delta})
+    )
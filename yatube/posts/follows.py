@@ -0,0 +1,96 @@
+from django.db import connections, router, transaction
+
+from core.sqlite import retry_on_busy
+
+from . import counters, suggestions, timeline, trending, versions
+from .models import Follow, User
+
+
+def write_connection():
+    return connections[router.db_for_write(Follow)]
+
+
+def lock(user):
+    """Подписки одного читателя меняются по очереди: строка user
+    блокируется до конца транзакции, и прочитанное existing() не
+    устаревает до записи.
+
+    SQLite блокирует запись целиком уже на BEGIN IMMEDIATE
+    (retry_on_busy), а при отложенном BEGIN не даёт записать поверх
+    чужой фиксации, поэтому там блокировка строки не нужна.
+    """
+    if write_connection().features.has_select_for_update:
+        list(User.objects.select_for_update().filter(
+            pk=user.pk
+        ).values_list('pk', flat=True))
+
+
+def existing(user, author_ids):
+    # Читаем там же, куда пишем: реплика может отставать
+    return set(
+        Follow.objects.using(router.db_for_write(Follow))
+        .filter(user=user, author_id__in=author_ids)
+        .values_list('author_id', flat=True)
+    )
+
+
+@retry_on_busy
+@transaction.atomic
+def follow_many(user, author_ids):
+    """Подписывает user на авторов author_ids одной вставкой.
+
+    Повторный вызов ничего не меняет: уже оформленные подписки и
+    подписка на себя пропускаются. Сигналы bulk_create не вызывает,
+    поэтому счётчики, ленты и версии кэша обновляются здесь же.
+    Возвращает id новых авторов — ровно вставленные строки: между
+    чтением и вставкой их никто не изменит (см. lock).
+    """
+    author_ids = set(author_ids) - {user.pk}
+    lock(user)
+    new = sorted(author_ids - existing(user, author_ids))
+    if not new:
+        return []
+    # ignore_conflicts — на случай записи в обход follow_many;
+    # UniqueConstraint не даст создать дубль
+    Follow.objects.bulk_create(
+        [Follow(user=user, author_id=author_id) for author_id in new],
+        ignore_conflicts=True,
+    )
+    counters.bump(user.pk, following_count=len(new))
+    counters.bump_many(new, followers_count=1)
+    timeline.backfill_all(user_id=user.pk, author_ids=new)
+    versions.bump(f'follow:{user.pk}')
+    suggestions.mark_stale([user.pk])
+    trending.record_follows(new)
+    return new
+
+
+@retry_on_busy
+@transaction.atomic
+def unfollow_many(user, author_ids):
+    """Отписывает user от авторов author_ids одним DELETE.
+
+    Возвращает id авторов, от которых пользователь действительно
+    был подписан.
+    """
+    lock(user)
+    gone = sorted(existing(user, author_ids))
+    if not gone:
+        return []
+    # QuerySet.delete() выбирает строки и шлёт post_delete на каждую,
+    # а приватный _raw_delete не часть API: в Django 2.2 удалить пачку
+    # без сигналов можно только SQL-запросом
+    placeholders = ', '.join(['%s'] * len(gone))
+    with write_connection().cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {Follow._meta.db_table} '
+            f'WHERE user_id = %s AND author_id IN ({placeholders})',
+            [user.pk, *gone],
+        )
+    counters.bump(user.pk, following_count=-len(gone))
+    counters.bump_many(gone, followers_count=-1)
+    timeline.drop_many(user.pk, gone)
+    timeline.catch_up(gone)
+    versions.bump(f'follow:{user.pk}')
+    suggestions.mark_stale([user.pk])
+    return gone
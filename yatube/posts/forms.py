@@ -1,4 +1,7 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
 
 from .models import Group, Post, Comment
 
@@ -18,6 +21,37 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файл, отброшенный SizeLimitedUploadHandler, не разбираем вовсе
+        self.image_rejected = getattr(
+            self.files.get('image'), 'rejected', False
+        )
+        if self.image_rejected:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.image_rejected:
+            raise ValidationError(
+                'Файл больше %s.' % filesizeformat(
+                    settings.POST_IMAGE_MAX_UPLOAD_SIZE
+                ),
+                code='too_large',
+            )
+        image = self.cleaned_data['image']
+        # Размеры, прочитанные ImageField из заголовка картинки
+        header = getattr(image, 'image', None)
+        if header and (
+            header.size[0] * header.size[1] > settings.POST_IMAGE_MAX_PIXELS
+        ):
+            raise ValidationError(
+                'В картинке больше %(limit)s пикселей.',
+                code='too_many_pixels',
+                params={'limit': settings.POST_IMAGE_MAX_PIXELS},
+            )
+        return image
+
 
 class CommentForm(forms.ModelForm):
     text = forms.CharField(
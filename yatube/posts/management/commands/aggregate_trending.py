@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Переносит накопившуюся активность в оценки популярных '
+            'постов и групп. С --loop работает постоянно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--loop', action='store_true')
+        parser.add_argument(
+            '--interval', type=float, default=60,
+            help='Секунд между проходами в режиме --loop.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = trending.aggregate(options['batch_size'])
+            self.stdout.write(f'Обработано событий: {processed}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
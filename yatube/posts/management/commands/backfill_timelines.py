@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок по существующим подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Предварительно очистить все ленты.',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            TimelineEntry.objects.all().delete()
+        total = timeline.backfill_all()
+        self.stdout.write(
+            self.style.SUCCESS(f'Добавлено записей в ленты: {total}')
+        )
@@ -0,0 +1,135 @@
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+
+from posts.management.commands.bench_views import percentile
+from posts.models import User
+from posts.seed import scratch_database, seed_site
+
+# Настройки SQLite по умолчанию для сравнения с settings.SQLITE_PRAGMAS;
+# busy_timeout остаётся от модуля sqlite3 — 5 секунд
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'mmap_size': 0,
+    'cache_size': -2000,
+}
+
+
+def run_worker(args):
+    """Процесс gunicorn: читает страницы постов или пишет комментарии."""
+    role, duration, user_id, post_ids, seed = args
+    # Соединения родителя не переживают fork
+    connections.close_all()
+    rng = random.Random(seed)
+    client = Client()
+    client.force_login(User.objects.get(pk=user_id))
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        post_id = rng.choice(post_ids)
+        started = time.perf_counter()
+        try:
+            if role == 'reader':
+                client.get(reverse('posts:post_detail', args=[post_id]))
+            else:
+                client.post(
+                    reverse('posts:add_comment', args=[post_id]),
+                    {'text': f'Комментарий {rng.getrandbits(32)}'},
+                )
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    return role, latencies, errors
+
+
+class Command(BaseCommand):
+    help = ('Замеряет чтение страниц постов, пока параллельно пишутся '
+            'комментарии: настройки SQLite по умолчанию против '
+            'settings.SQLITE_PRAGMAS с повтором при SQLITE_BUSY.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Секунд на каждый профиль.',
+        )
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument(
+            '--profile',
+            action='append',
+            choices=('default', 'tuned'),
+            help='Можно указать несколько раз; по умолчанию оба.',
+        )
+        parser.add_argument(
+            '--with-fragment-cache',
+            action='store_true',
+            help='Не отключать кэш фрагментов: по умолчанию чтения '
+                 'идут в базу.',
+        )
+
+    def bench(self, profile, created, options):
+        # Процессы получают настройки родителя при fork
+        if profile == 'default':
+            settings.SQLITE_PRAGMAS = DEFAULT_PRAGMAS
+            settings.SQLITE_BUSY_RETRIES = 0
+        else:
+            settings.SQLITE_PRAGMAS = self.tuned
+            settings.SQLITE_BUSY_RETRIES = self.retries
+        # Новое соединение переключает journal_mode до запуска процессов
+        connections.close_all()
+        User.objects.exists()
+        connections.close_all()
+        jobs = [
+            ('reader', options['duration'], created['users'][0],
+             created['posts'], seed)
+            for seed in range(options['readers'])
+        ] + [
+            ('writer', options['duration'], created['users'][0],
+             created['posts'], 1000 + seed)
+            for seed in range(options['writers'])
+        ]
+        with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+            results = pool.map(run_worker, jobs)
+        self.stdout.write(self.style.MIGRATE_HEADING(profile))
+        for role in ('reader', 'writer'):
+            latencies = sorted(
+                latency for name, values, _ in results if name == role
+                for latency in values
+            )
+            errors = sum(
+                count for name, _, count in results if name == role
+            )
+            if not latencies:
+                self.stdout.write(f'  {role}: нет успешных запросов, '
+                                  f'ошибок {errors}')
+                continue
+            self.stdout.write(
+                f'  {role}: {len(latencies) / options["duration"]:.0f} '
+                f'зап/с, p50 {percentile(latencies, 50) * 1000:.1f} мс, '
+                f'p95 {percentile(latencies, 95) * 1000:.1f} мс, '
+                f'p99 {percentile(latencies, 99) * 1000:.1f} мс, '
+                f'«database is locked»: {errors}'
+            )
+
+    def handle(self, *args, **options):
+        self.tuned = settings.SQLITE_PRAGMAS
+        self.retries = settings.SQLITE_BUSY_RETRIES
+        if not options['with_fragment_cache']:
+            settings.FRAGMENT_CACHE_TIMEOUT = 0
+        with scratch_database():
+            created = seed_site(
+                users=50, groups=5, posts=options['posts'],
+                comments=options['posts'], follows=200,
+            )
+            for profile in options['profile'] or ('default', 'tuned'):
+                self.bench(profile, created, options)
@@ -0,0 +1,78 @@
+import copy
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+
+from posts import versions
+from posts.models import Post
+from posts.seed import scratch_database, seed_site
+from utils import pagination
+
+LOADERS = {
+    'filesystem': [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ],
+}
+LOADERS['cached'] = [('django.template.loaders.cached.Loader',
+                      LOADERS['filesystem'])]
+
+
+def engine(loaders):
+    config = settings.TEMPLATES[0]
+    return DjangoTemplates({
+        'NAME': f'bench-{id(loaders)}',
+        'DIRS': config['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': {**config['OPTIONS'], 'loaders': loaders},
+    })
+
+
+class Command(BaseCommand):
+    help = ('Замеряет процессорное время отрисовки страницы ленты '
+            'с кэшем шаблонов и без него. Кэш фрагментов отключён.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=300)
+        parser.add_argument('--template', default='posts/index.html')
+        parser.add_argument('--page-size', type=int,
+                            default=settings.POSTS_ON_PAGE)
+
+    def handle(self, *args, **options):
+        # {% cache %} берёт кэш template_fragments, если он настроен
+        settings.CACHES['template_fragments'] = {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+        settings.POSTS_ON_PAGE = options['page_size']
+        renders = options['renders']
+        with scratch_database():
+            seed_site(users=20, groups=3, posts=options['page_size'] * 2,
+                      comments=0, follows=0)
+            request = RequestFactory().get('/')
+            request.user = AnonymousUser()
+            context = pagination(Post.objects.for_feed(), request,
+                                 keyset=True)
+            context.update(versions.fragment_context('posts'))
+            posts = list(context['page_obj'].object_list)
+            # У каждой отрисовки свои экземпляры: кэш адресов на
+            # экземпляре не переходит между запросами
+            pages = [[copy.copy(post) for post in posts]
+                     for _ in range(renders)]
+            for label, loaders in LOADERS.items():
+                backend = engine(loaders)
+                backend.get_template(options['template'])
+                started = time.process_time()
+                for page in pages:
+                    context['page_obj'].object_list = page
+                    backend.get_template(options['template']).render(
+                        context, request
+                    )
+                cpu = (time.process_time() - started) / renders
+                self.stdout.write(
+                    f'{label:<10} {cpu * 1000:.3f} мс CPU на страницу '
+                    f'из {len(posts)} постов'
+                )
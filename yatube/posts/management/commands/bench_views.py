@@ -0,0 +1,240 @@
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import isolated_caches
+from posts.models import Group, Post, User
+from posts.seed import scratch_database, seed_site
+
+READ_VIEWS = ('index', 'group_posts', 'profile', 'post_detail',
+              'follow_index')
+WRITE_VIEWS = ('post_create', 'add_comment')
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга; values отсортированы."""
+    if not values:
+        return None
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+def summarize(latencies, queries, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'rps': round(len(latencies) / elapsed, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'statuses': {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер представлений posts через тестовый клиент: '
+            'p50/p95/p99, запросов в секунду и SQL-запросов на запрос.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Запросов на каждое представление.',
+        )
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--view',
+            action='append',
+            choices=READ_VIEWS + WRITE_VIEWS,
+            help='Можно указать несколько раз; по умолчанию все.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов в JSON.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON прошлого замера: вывести изменения p95 и rps.',
+        )
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help=('Наполнить и мерить текущую базу вместо временной. '
+                  'Данные не удаляются.'),
+        )
+
+    def targets(self, rng):
+        """Для каждого представления функция, выдающая (метод, URL, data)."""
+        posts = list(Post.objects.values_list('pk', flat=True)[:1000])
+        groups = list(Group.objects.values_list('slug', flat=True))
+        authors = list(
+            User.objects.filter(stats__posts_count__gt=0)
+            .values_list('username', flat=True)[:1000]
+        )
+        if not (posts and groups and authors):
+            raise CommandError('Нет данных для замера: проверьте --posts.')
+        return {
+            'index': lambda: ('get', reverse('posts:posts_main'), None),
+            'group_posts': lambda: ('get', reverse(
+                'posts:posts_group_list', args=[rng.choice(groups)]
+            ), None),
+            'profile': lambda: ('get', reverse(
+                'posts:profile', args=[rng.choice(authors)]
+            ), None),
+            'post_detail': lambda: ('get', reverse(
+                'posts:post_detail', args=[rng.choice(posts)]
+            ), None),
+            'follow_index': lambda: (
+                'get', reverse('posts:follow_index'), None
+            ),
+            'post_create': lambda: ('post', reverse('posts:create_post'), {
+                'text': f'Замер {rng.getrandbits(32)}',
+                'group': '',
+            }),
+            'add_comment': lambda: ('post', reverse(
+                'posts:add_comment', args=[rng.choice(posts)]
+            ), {'text': f'Замер {rng.getrandbits(32)}'}),
+        }
+
+    def measure(self, client, target, requests, warmup):
+        for _ in range(warmup):
+            method, url, data = target()
+            getattr(client, method)(url, data)
+        latencies, queries, statuses = [], [], Counter()
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, url, data = target()
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                latencies.append(time.perf_counter() - request_started)
+            queries.append(len(captured))
+            statuses[response.status_code] += 1
+        return summarize(
+            latencies, queries, statuses, time.perf_counter() - started
+        )
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        if options['posts']:
+            created = seed_site(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+                seed=options['seed'],
+            )
+        else:
+            created = {'users': list(User.objects.values_list(
+                'pk', flat=True
+            ))}
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        # Читатель с самой большой лентой подписок
+        reader = (
+            User.objects.filter(pk__in=created['users'])
+            .order_by('-stats__following_count', 'pk').first()
+        )
+        client = Client()
+        client.force_login(reader)
+        targets = self.targets(rng)
+        results = {}
+        # Записи идут последними, чтобы не менять данные под чтениями
+        for name in READ_VIEWS + WRITE_VIEWS:
+            if options['view'] and name not in options['view']:
+                continue
+            results[name] = self.measure(
+                client, targets[name], options['requests'], options['warmup']
+            )
+            self.report(name, results[name])
+        return results
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<13} p50 {result["p50_ms"]:>8.2f} мс'
+            f'  p95 {result["p95_ms"]:>8.2f} мс'
+            f'  p99 {result["p99_ms"]:>8.2f} мс'
+            f'  {result["rps"]:>8.1f} зап/с'
+            f'  SQL {result["queries_per_request"]:>5.1f}'
+        )
+
+    def compare(self, path, results):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)['views']
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сравнение с {path}'))
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            old = baseline[name]
+            p95 = (result['p95_ms'] - old['p95_ms']) / old['p95_ms']
+            rps = (result['rps'] - old['rps']) / old['rps']
+            line = (
+                f'{name:<13} p95 {p95:+.1%}  rps {rps:+.1%}'
+                f'  SQL {old["queries_per_request"]:.1f}'
+                f' → {result["queries_per_request"]:.1f}'
+            )
+            self.stdout.write(
+                self.style.WARNING(line) if p95 > 0.1 else line
+            )
+
+    def handle(self, *args, **options):
+        if options['in_place']:
+            # Данные рабочие, но кэш свой: замер начинается с пустого
+            # кэша и не трогает кэш сервера
+            with isolated_caches():
+                results = self.run(options)
+        else:
+            with scratch_database():
+                results = self.run(options)
+        if options['output']:
+            scale = ('users', 'groups', 'posts', 'comments', 'follows',
+                     'seed', 'requests', 'warmup')
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'revision': git_revision(),
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'database': connection.vendor,
+                    'cache': settings.CACHES['default']['BACKEND'],
+                    'scale': {key: options[key] for key in scale},
+                    'views': results,
+                }, output, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if options['compare']:
+            self.compare(options['compare'], results)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+from posts.models import SuggestionQueue, User
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «Кого почитать». По умолчанию — '
+            'только для пользователей, чьи подписки или подписки их '
+            'авторов изменились; --full — для всех.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['full']:
+            queued = list(
+                SuggestionQueue.objects.values_list('user_id', flat=True)
+            )
+            users = list(User.objects.values_list('pk', flat=True))
+        else:
+            queued, users = suggestions.stale_users()
+        batch_size = options['batch_size']
+        total = 0
+        for start in range(0, len(users), batch_size):
+            total += suggestions.compute(users[start:start + batch_size])
+        # Попавшие в очередь во время расчёта остаются до следующего
+        SuggestionQueue.objects.filter(user_id__in=queued).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(users)}, рекомендаций: {total}'
+        ))
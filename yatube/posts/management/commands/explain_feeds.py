@@ -0,0 +1,112 @@
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seed import scratch_database, seed_posts
+from utils import KeysetPaginator
+
+FILESORT_MARKERS = ('USE TEMP B-TREE', 'Using filesort')
+
+
+class Command(BaseCommand):
+    help = ('Показывает планы запросов лент и проверяет, '
+            'что ни один из них не сортирует выборку без индекса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Проверить на временной базе с таким числом постов, '
+                 'например 1000000.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def feed_querysets(self):
+        """Запросы в том виде, в каком их строят представления: с
+        for_feed() и условием курсора KeysetPaginator."""
+        per_page = settings.POSTS_ON_PAGE
+        post = Post.objects.first()
+        group = Group.objects.first()
+        user = User.objects.first()
+        cursor = (post.pub_date, post.pk) if post else (timezone.now(), 0)
+        comment_cursor = (
+            Comment.objects.values_list('created', 'pk').first()
+            or (timezone.now(), 0)
+        )
+
+        def page(query, cursor=None, field='pub_date', per_page=per_page):
+            if cursor is not None:
+                paginator = KeysetPaginator(query, per_page, field)
+                query = query.filter(paginator._keyset(*cursor, 'lt'))
+            return query.order_by(f'-{field}', '-pk')[:per_page + 1]
+
+        feeds = {
+            'index': Post.objects.for_feed(),
+            'group_posts': Post.objects.for_feed().filter(group=group),
+            'profile': Post.objects.for_feed().filter(author=user),
+        }
+        if user is not None:
+            feeds['follow_index'] = timeline.feed(user)
+        querysets = {}
+        for name, query in feeds.items():
+            querysets[name] = page(query)
+            querysets[f'{name} (курсор)'] = page(query, cursor)
+        comments = Comment.objects.filter(post=post).select_related('author')
+        querysets.update({
+            'profile (following)': Follow.objects.filter(
+                user=user, author=user
+            )[:1],
+            'post_detail (comments)': page(
+                comments, field='created',
+                per_page=settings.COMMENTS_ON_PAGE,
+            ),
+            'post_detail (comments, курсор)': page(
+                comments, comment_cursor, field='created',
+                per_page=settings.COMMENTS_ON_PAGE,
+            ),
+        })
+        return querysets
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        prefix = (
+            'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+            else 'EXPLAIN '
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        # Посты для проверки создаются во временной базе, а не в рабочей
+        with scratch_database() if options['seed'] else nullcontext():
+            if options['seed']:
+                seed_posts(
+                    options['seed'], batch_size=options['batch_size']
+                )
+                if connection.vendor == 'sqlite':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                self.stdout.write(f'Создано постов: {options["seed"]}')
+            self.check_plans()
+
+    def check_plans(self):
+        failed = []
+        for name, queryset in self.feed_querysets().items():
+            plan = self.explain(queryset)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for line in plan:
+                self.stdout.write(f'  {line}')
+            if any(m in line for line in plan for m in FILESORT_MARKERS):
+                failed.append(name)
+        if failed:
+            raise CommandError(
+                'Сортировка без индекса: ' + ', '.join(failed)
+            )
+        self.stdout.write(self.style.SUCCESS('Все ленты читаются по индексу.'))
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает группы, посты, комментарии или подписки '
+            'в JSON Lines или CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(transfer.MODELS))
+        parser.add_argument(
+            '--output',
+            help='Файл выгрузки; по умолчанию стандартный вывод.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(transfer.WRITERS),
+            help='По умолчанию берётся из расширения --output, иначе jsonl.',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--progress-every', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        path = options['output']
+        write = transfer.WRITERS[
+            options['format'] or transfer.format_of(path)
+        ]
+        progress = transfer.Progress(
+            self.stderr.write, options['progress_every']
+        )
+        rows = transfer.export_rows(options['model'], options['batch_size'])
+        if path:
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                write(options['model'], transfer.tracked(rows, progress),
+                      output)
+        else:
+            write(options['model'], transfer.tracked(rows, progress),
+                  sys.stdout)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено строк: {progress.total}, '
+            f'{progress.rate:.0f} строк/с'
+        ))
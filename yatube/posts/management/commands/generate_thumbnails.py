@@ -0,0 +1,36 @@
+import multiprocessing
+import os
+
+from django import db
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для всех картинок постов на всех ядрах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True)
+            .iterator()
+        )
+        # Дочерние процессы откроют собственные соединения с базой
+        db.connections.close_all()
+        with multiprocessing.Pool(options['workers']) as pool:
+            for done, _ in enumerate(
+                pool.imap_unordered(thumbnails.generate, names, 16),
+                start=1,
+            ):
+                if done % 100 == 0:
+                    self.stdout.write(f'{done}/{len(names)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(names)}'
+        ))
@@ -0,0 +1,90 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает группы, посты, комментарии или подписки '
+            'из JSON Lines или CSV пачками bulk_create. Файлы разных '
+            'моделей загружаются по порядку: group, post, comment, follow.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files',
+            nargs='+',
+            metavar='model=path',
+            help='Например post=posts.jsonl; путь «-» — стандартный ввод.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(transfer.READERS),
+            help='По умолчанию берётся из расширения файла, иначе jsonl.',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--progress-every', type=int, default=100000)
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help='Пропускать строки, которые уже есть в базе.',
+        )
+        parser.add_argument(
+            '--no-rebuild',
+            action='store_true',
+            help=('Не пересчитывать счётчики, ленты и поисковый индекс '
+                  'после загрузки.'),
+        )
+
+    def parse_files(self, files):
+        order = list(transfer.MODELS)
+        pairs = []
+        for item in files:
+            name, _, path = item.partition('=')
+            if name not in transfer.MODELS or not path:
+                raise CommandError(
+                    f'{item}: ожидается model=path, model из {order}'
+                )
+            pairs.append((name, path))
+        return sorted(pairs, key=lambda pair: order.index(pair[0]))
+
+    def load(self, name, path, options):
+        read = transfer.READERS[
+            options['format'] or transfer.format_of(path)
+        ]
+        progress = transfer.Progress(
+            self.stderr.write, options['progress_every']
+        )
+        self.stderr.write(self.style.MIGRATE_HEADING(f'{name}: {path}'))
+        if path == '-':
+            source = nullcontext(sys.stdin)
+        else:
+            source = open(path, encoding='utf-8', newline='')
+        with source as lines:
+            try:
+                total = transfer.import_rows(
+                    name,
+                    read(lines),
+                    batch_size=options['batch_size'],
+                    ignore_conflicts=options['ignore_conflicts'],
+                    progress=progress,
+                )
+            except IntegrityError as error:
+                raise CommandError(
+                    f'{name}: {error}. Загружено строк до ошибки: '
+                    f'{progress.total}; повторите с --ignore-conflicts.'
+                )
+        self.stderr.write(
+            f'  загружено строк: {total}, {progress.rate:.0f} строк/с'
+        )
+
+    def handle(self, *args, **options):
+        files = self.parse_files(options['files'])
+        for name, path in files:
+            self.load(name, path, options)
+        if not options['no_rebuild']:
+            self.stderr.write('Пересчёт счётчиков, лент и индекса поиска…')
+            transfer.rebuild_derived([name for name, _ in files])
+        self.stderr.write(self.style.SUCCESS('Загрузка завершена.'))
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# DDL зафиксирован здесь, а не взят из posts.search: правки модуля
+# не должны менять историю миграций. Индекс заполняется после
+# миграций, см. posts.apps.
+CREATE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search '
+    'USING fts5(text, comments, '
+    "tokenize = 'unicode61 remove_diacritics 0')"
+)
+DROP = 'DROP TABLE IF EXISTS posts_search'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(CREATE)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
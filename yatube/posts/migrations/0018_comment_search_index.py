@@ -0,0 +1,43 @@
+from django.db import migrations
+
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 0'"
+FORWARD = [
+    'DROP TABLE IF EXISTS posts_search',
+    f'CREATE VIRTUAL TABLE posts_search USING fts5(text, {TOKENIZE})',
+    'CREATE VIRTUAL TABLE posts_comment_search '
+    f'USING fts5(text, post_id UNINDEXED, {TOKENIZE})',
+]
+BACKWARD = [
+    'DROP TABLE IF EXISTS posts_comment_search',
+    'DROP TABLE IF EXISTS posts_search',
+    f'CREATE VIRTUAL TABLE posts_search USING fts5(text, comments, '
+    f'{TOKENIZE})',
+]
+
+
+def split_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    # Заполняет индекс posts.apps после миграций: стеммер из
+    # posts.search не должен становиться частью истории миграций
+    for sql in FORWARD:
+        schema_editor.execute(sql)
+
+
+def merge_index(apps, schema_editor):
+    # Пустой индекс старой формы; заполнить — rebuild_search_index
+    # той версии кода
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in BACKWARD:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_index, merge_index),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.urls import reverse
+from django.utils.functional import cached_property
 
 User = get_user_model()
 
@@ -12,6 +14,30 @@ class Group(models.Model):
     def __str__(self):
         return self.title
 
+    def get_absolute_url(self):
+        return reverse('posts:posts_group_list', args=[self.slug])
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним JOIN, только поля,
+        которые выводят шаблоны; число комментариев берётся
+        из Post.comments_count.
+        """
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'image',
+            'comments_count',
+            'author',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group',
+            'group__title',
+            'group__slug',
+        )
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -42,15 +68,55 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    # Адреса карточки поста вычисляются один раз на экземпляр:
+    # лента выводит их для каждого поста страницы
+    @cached_property
+    def url(self):
+        return reverse('posts:post_detail', args=[self.pk])
+
+    @cached_property
+    def author_url(self):
+        return reverse('posts:profile', args=[self.author.username])
+
+    @cached_property
+    def group_url(self):
+        if self.group_id is None:
+            return reverse('posts:posts_main')
+        return self.group.get_absolute_url()
+
+    def get_absolute_url(self):
+        return self.url
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -81,6 +147,12 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -105,3 +177,175 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='follow_unique_user_author',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Читатель',
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='timeline_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_unique_user_post',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} <- {self.post}'
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, поддерживаемые при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пользователь',
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендация автора для подписки, см. posts.suggestions."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='follow_suggestions',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+    )
+    score = models.FloatField('Оценка')
+    mutual = models.PositiveIntegerField(
+        'Подписки пользователя, читающие автора', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='suggestion_unique_user_author',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='suggestion_user_score_idx',
+            ),
+        ]
+
+
+class SuggestionQueue(models.Model):
+    """Пользователи, чьи подписки изменились после расчёта рекомендаций."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пользователь',
+        related_name='+',
+    )
+
+    class Meta:
+        verbose_name = 'Очередь пересчёта рекомендаций'
+        verbose_name_plural = 'Очередь пересчёта рекомендаций'
+
+
+class TrendingEvent(models.Model):
+    """Необработанная активность для posts.trending: комментарий к посту
+    или подписка на автора."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    weight = models.FloatField('Вес')
+    created = models.DateTimeField('Время', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Событие активности'
+        verbose_name_plural = 'События активности'
+
+
+class TrendingPost(models.Model):
+    """Затухающая популярность поста: чем больше score, тем выше."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    score = models.FloatField('Оценка', db_index=True)
+
+    class Meta:
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+
+
+class TrendingGroup(models.Model):
+    """Затухающая популярность группы: чем больше score, тем выше."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Группа',
+    )
+    score = models.FloatField('Оценка', db_index=True)
+
+    class Meta:
+        verbose_name = 'Популярная группа'
+        verbose_name_plural = 'Популярные группы'
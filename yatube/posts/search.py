@@ -0,0 +1,302 @@
+import re
+from functools import lru_cache
+
+from django.db import connection as default_connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import Comment, Post
+
+# Тексты постов (rowid — id поста) и комментариев (rowid — id
+# комментария): запись комментария не трогает строки остальных
+TABLE = 'posts_search'
+COMMENT_TABLE = 'posts_comment_search'
+# Множители bm25: совпадение в тексте поста выше, чем в комментарии
+TEXT_WEIGHT = 4.0
+COMMENT_WEIGHT = 1.0
+# Посты, подходящие под запрос, с оценкой каждого совпадения;
+# оба %s — выражение MATCH
+MATCHES = (
+    f'SELECT rowid AS post_id, bm25({TABLE}) * {TEXT_WEIGHT} AS rank '
+    f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+    f'UNION ALL '
+    f'SELECT post_id, bm25({COMMENT_TABLE}) * {COMMENT_WEIGHT} '
+    f'FROM {COMMENT_TABLE} WHERE {COMMENT_TABLE} MATCH %s'
+)
+
+WORD = re.compile(r'\w+')
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(after_a=(), plain=()):
+    """Окончания по убыванию длины; True — должно стоять после «а» или «я»."""
+    pairs = [(ending, True) for ending in after_a]
+    pairs += [(ending, False) for ending in plain]
+    return sorted(pairs, key=lambda pair: -len(pair[0]))
+
+
+PERFECTIVE_GERUND = _endings(
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = _endings(plain=(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+    'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая',
+    'яя', 'ою', 'ею',
+))
+PARTICIPLE = _endings(('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = _endings(plain=('ся', 'сь'))
+VERB = _endings(
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = _endings(plain=(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+))
+SUPERLATIVE = _endings(plain=('ейш', 'ейше'))
+DERIVATIONAL = _endings(plain=('ост', 'ость'))
+
+
+def _region(word, start=0):
+    """Начало области после первой пары «гласная, согласная» от start."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(word, start, endings):
+    """Отрезает самое длинное окончание из endings внутри word[start:].
+
+    Возвращает None, если окончание не найдено или не выполнено условие
+    про предшествующую «а»/«я».
+    """
+    for ending, after_a in endings:
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if after_a and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            return None
+        return word[:cut]
+    return None
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball (Porter) для русского."""
+    word = word.lower().replace('ё', 'е')
+    rv = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), len(word)
+    )
+    r2 = _region(word, _region(word))
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stripped = _strip(word, rv, ADJECTIVE)
+        if stripped is not None:
+            stripped = _strip(stripped, rv, PARTICIPLE) or stripped
+        else:
+            stripped = _strip(word, rv, VERB)
+            if stripped is None:
+                stripped = _strip(word, rv, NOUN)
+    word = word if stripped is None else stripped
+    if word.endswith('и') and len(word) > rv:
+        word = word[:-1]
+    word = _strip(word, max(r2, rv), DERIVATIONAL) or word
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+    elif word.endswith('ь') and len(word) > rv:
+        word = word[:-1]
+    return word
+
+
+def terms(text):
+    """Основы слов текста в том виде, в каком они лежат в индексе."""
+    return [stem(word) for word in WORD.findall(strip_tags(text or ''))]
+
+
+def document(text):
+    return ' '.join(terms(text))
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы из query должны встретиться в записи."""
+    return ' '.join(f'"{term}"' for term in terms(query))
+
+
+def enabled(connection=None):
+    return (connection or default_connection).vendor == 'sqlite'
+
+
+def index_post(post_id, text):
+    if not enabled():
+        return
+    with default_connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [post_id, document(text)],
+        )
+
+
+def remove_post(post_id):
+    """Убирает текст поста; его комментарии убираются своими сигналами
+    при каскадном удалении."""
+    if not enabled():
+        return
+    with default_connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_comment(comment_id, post_id, text):
+    if not enabled():
+        return
+    with default_connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s', [comment_id]
+        )
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id) '
+            f'VALUES (%s, %s, %s)',
+            [comment_id, document(text), post_id],
+        )
+
+
+def remove_comment(comment_id):
+    if not enabled():
+        return
+    with default_connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s', [comment_id]
+        )
+
+
+def _fill(cursor, connection, table, columns, source, batch_size):
+    """Переносит строки source в table пачками по id; первый из
+    columns — текст, он индексируется основами слов."""
+    total, last_id = 0, 0
+    names = ', '.join(columns)
+    placeholders = ', '.join(['%s'] * (len(columns) + 1))
+    while True:
+        cursor.execute(
+            f'SELECT id, {names} FROM {source} '
+            f'WHERE id > %s ORDER BY id LIMIT %s',
+            [last_id, batch_size],
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return total
+        last_id = rows[-1][0]
+        with transaction.atomic(using=connection.alias):
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, {names}) '
+                f'VALUES ({placeholders})',
+                [(pk, document(text), *rest) for pk, text, *rest in rows],
+            )
+        total += len(rows)
+
+
+def rebuild(connection=None, batch_size=1000):
+    """Строит индекс заново по всем постам и комментариям.
+
+    Возвращает число постов.
+    """
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE}')
+        _fill(cursor, connection, COMMENT_TABLE, ('text', 'post_id'),
+              Comment._meta.db_table, batch_size)
+        return _fill(cursor, connection, TABLE, ('text',),
+                     Post._meta.db_table, batch_size)
+
+
+def fill_if_empty(connection):
+    """Строит индекс, если он пуст, а посты есть: так бывает сразу
+    после миграций, создающих таблицы индекса."""
+    if not enabled(connection):
+        return None
+    # После отката миграций таблиц может не быть или они старой формы
+    tables = connection.introspection.table_names()
+    if TABLE not in tables or COMMENT_TABLE not in tables:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {TABLE} LIMIT 1')
+        if cursor.fetchone():
+            return None
+    if not Post.objects.using(connection.alias).exists():
+        return None
+    return rebuild(connection)
+
+
+def matching_ids(match):
+    return RawSQL(f'SELECT post_id FROM ({MATCHES})', [match, match])
+
+
+def filter_posts(queryset, query):
+    """Сужает queryset постов до найденных по query, без ранжирования."""
+    if not enabled():
+        return queryset.filter(text__icontains=query)
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=matching_ids(match))
+
+
+class SearchResults:
+    """Найденные посты по убыванию bm25 для Paginator.
+
+    Пост подходит, если запросу отвечает его текст или один из
+    комментариев; оценка — лучшая из совпадений. Число совпадений и
+    страница считаются в индексе FTS5; из posts_post загружаются только
+    посты текущей страницы.
+    """
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+
+    def _fetch(self, sql, params):
+        if not self.match:
+            return []
+        with default_connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def count(self):
+        rows = self._fetch(
+            f'SELECT count(DISTINCT post_id) FROM ({MATCHES})',
+            [self.match, self.match],
+        )
+        return rows[0][0] if rows else 0
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step:
+            raise TypeError('SearchResults поддерживает только срезы.')
+        start = index.start or 0
+        limit = -1 if index.stop is None else max(index.stop - start, 0)
+        ids = [row[0] for row in self._fetch(
+            f'SELECT post_id FROM ({MATCHES}) GROUP BY post_id '
+            f'ORDER BY MIN(rank), post_id LIMIT %s OFFSET %s',
+            [self.match, self.match, limit, start],
+        )]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search(query):
+    if not enabled():
+        return filter_posts(Post.objects.for_feed(), query)
+    return SearchResults(query)
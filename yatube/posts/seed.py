@@ -0,0 +1,198 @@
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from core.cache import isolated_caches
+from . import counters, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def explicit_dates(model, field_name):
+    """Отключает auto_now_add, чтобы bulk_create сохранил заданные даты."""
+    field = model._meta.get_field(field_name)
+    auto_now_add = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = auto_now_add
+
+
+@contextmanager
+def scratch_database():
+    """Временная база с применёнными миграциями для замеров.
+
+    SQLite создаётся файлом, а не в памяти: замер должен включать
+    работу с диском. Кэши тоже временные: фрагменты из тестовых данных
+    не попадают в кэш сервера.
+    """
+    test_settings = connection.settings_dict['TEST']
+    test_name = test_settings.get('NAME')
+    path = None
+    if connection.vendor == 'sqlite' and not test_name:
+        descriptor, path = tempfile.mkstemp(
+            prefix='yatube_bench_', suffix='.sqlite3'
+        )
+        os.close(descriptor)
+        test_settings['NAME'] = path
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        with isolated_caches():
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = test_name
+        if path:
+            for leftover in (path, f'{path}-wal', f'{path}-shm'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+
+def seed_posts(count, authors=100, groups=10, batch_size=5000):
+    """Создаёт count постов пачками через bulk_create.
+
+    pub_date разносится по прошлому, чтобы ленты были упорядочены
+    так же, как на живом сайте. Сигналы при bulk_create не вызываются.
+    """
+    users = User.objects.bulk_create(
+        User(username=f'seed_author_{i}_{random.getrandbits(32)}')
+        for i in range(authors)
+    )
+    group_objs = Group.objects.bulk_create(
+        Group(
+            title=f'Группа {i}',
+            slug=f'seed-group-{i}-{random.getrandbits(32)}',
+            description='',
+        )
+        for i in range(groups)
+    )
+    author_ids = [user.pk for user in User.objects.filter(
+        username__in=[user.username for user in users]
+    )]
+    group_ids = [group.pk for group in Group.objects.filter(
+        slug__in=[group.slug for group in group_objs]
+    )] + [None]
+    now = timezone.now()
+    posts = (
+        Post(
+            text=f'Тестовый пост {i}',
+            author_id=random.choice(author_ids),
+            group_id=random.choice(group_ids),
+            pub_date=now - timedelta(seconds=i),
+        )
+        for i in range(count)
+    )
+    with explicit_dates(Post, 'pub_date'):
+        for batch in batched(posts, batch_size):
+            with transaction.atomic():
+                Post.objects.bulk_create(batch)
+    return author_ids, group_ids
+
+
+def seed_site(users=100, groups=10, posts=1000, comments=2000, follows=500,
+              seed=0, batch_size=5000):
+    """Наполняет базу связными данными для нагрузочных замеров.
+
+    Тексты берутся из Faker, выбор авторов и дат — из random.Random(seed),
+    поэтому при одинаковых параметрах на пустой базе получается
+    одинаковый набор. Счётчики и ленты подписок пересчитываются в конце,
+    так как bulk_create не вызывает сигналы.
+    Возвращает словарь с первичными ключами созданных объектов.
+    """
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    now = timezone.now()
+    User.objects.bulk_create(
+        User(
+            username=f'bench_{i}_{fake.user_name()}'[:150],
+            first_name=fake.first_name(),
+            last_name=fake.last_name(),
+        )
+        for i in range(users)
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith='bench_')
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    Group.objects.bulk_create(
+        Group(
+            title=fake.sentence(nb_words=3)[:200],
+            slug=f'bench-{i}',
+            description=fake.paragraph(),
+        )
+        for i in range(groups)
+    )
+    group_ids = list(
+        Group.objects.filter(slug__startswith='bench-')
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    with explicit_dates(Post, 'pub_date'):
+        for batch in batched(
+            (
+                Post(
+                    text=fake.paragraph(nb_sentences=5),
+                    author_id=rng.choice(user_ids),
+                    group_id=rng.choice(group_ids + [None]),
+                    pub_date=now - timedelta(minutes=i),
+                )
+                for i in range(posts)
+            ),
+            batch_size,
+        ):
+            with transaction.atomic():
+                Post.objects.bulk_create(batch)
+    post_ids = list(
+        Post.objects.filter(author_id__in=user_ids)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    if post_ids:
+        with explicit_dates(Comment, 'created'):
+            for batch in batched(
+                (
+                    Comment(
+                        post_id=rng.choice(post_ids),
+                        author_id=rng.choice(user_ids),
+                        text=fake.sentence(),
+                        created=now - timedelta(seconds=i),
+                    )
+                    for i in range(comments)
+                ),
+                batch_size,
+            ):
+                with transaction.atomic():
+                    Comment.objects.bulk_create(batch)
+    pairs = {
+        tuple(rng.sample(user_ids, 2))
+        for _ in range(follows if len(user_ids) > 1 else 0)
+    }
+    for batch in batched(
+        (Follow(user_id=user, author_id=author) for user, author in pairs),
+        batch_size,
+    ):
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+    users_qs = User.objects.filter(pk__in=user_ids)
+    counters.recount(users_qs)
+    counters.recount_comments()
+    timeline.backfill_all()
+    return {'users': user_ids, 'groups': group_ids, 'posts': post_ids}
@@ -0,0 +1,171 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (counters, search, suggestions, thumbnails, timeline,
+               trending, versions)
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.post_id:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id:
+        counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(instance.user_id, following_count=1)
+        counters.bump(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump(instance.user_id, following_count=-1)
+    counters.bump(instance.author_id, followers_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def drop_from_timeline(sender, instance, **kwargs):
+    timeline.drop(instance.user_id, instance.author_id)
+    timeline.catch_up([instance.author_id])
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, raw=False, **kwargs):
+    if instance.image and not raw:
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_index(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if instance.post_id and not raw:
+        search.index_comment(instance.pk, instance.post_id, instance.text)
+
+
+@receiver(post_delete, sender=Comment)
+def remove_comment_from_index(sender, instance, **kwargs):
+    search.remove_comment(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._saved_group_id = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    versions.bump(
+        'posts',
+        f'author:{instance.author_id}',
+        f'post:{instance.pk}',
+        *{
+            f'group:{group_id}'
+            for group_id in (
+                instance.group_id,
+                getattr(instance, '_saved_group_id', None),
+            )
+            if group_id
+        },
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    # Название и адрес группы выводятся и на страницах её постов, и в
+    # их карточках. Группы правят редко, поэтому сбрасываются все такие
+    # страницы; при удалении посты отвязываются без сигналов — до него.
+    posts = Post.objects.filter(group=instance).values_list('pk', 'author_id')
+    scopes = {f'group:{instance.pk}'}
+    for pk, author_id in posts:
+        scopes |= {'posts', f'post:{pk}', f'author:{author_id}'}
+    versions.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    if instance.post_id:
+        versions.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    versions.bump(f'follow:{instance.user_id}')
+
+
+@receiver(post_save, sender=Follow)
+def queue_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        suggestions.mark_stale([instance.user_id])
+
+
+@receiver(post_delete, sender=Follow)
+def queue_suggestions_after_unfollow(sender, instance, **kwargs):
+    # Подписки удаляются и вместе с пользователем: после коммита
+    # его уже нет, и в очередь он не попадает
+    transaction.on_commit(
+        lambda: suggestions.mark_stale([instance.user_id], existing=True)
+    )
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.post_id:
+        trending.record_comment(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def record_follow_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        trending.record_follows([instance.author_id])
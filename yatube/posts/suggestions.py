@@ -0,0 +1,140 @@
+"""Рекомендации «Кого почитать» по графу подписок.
+
+Граф подписок — разреженная матрица смежности F (F[u, a] = 1, если u
+читает a). Для пачки пользователей база считает её произведения
+соединениями таблицы posts_follow, без циклов по пользователям:
+
+* друзья друзей, F·F: сколько авторов, которых читает u, читают a;
+* совместные подписки, S·F, где S[u, v] — мера Жаккара множеств
+  подписок u и v: a читают пользователи со схожими с u подписками;
+  из строки S берутся SUGGESTION_SIMILAR_USERS самых похожих.
+
+Итог — взвешенная сумма; для каждого пользователя сохраняются
+SUGGESTIONS_PER_USER лучших авторов, на которых он ещё не подписан.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import versions
+from .models import (Follow, FollowSuggestion, SuggestionQueue, User,
+                     UserStats)
+
+
+def compute(user_ids):
+    """Пересчитывает рекомендации пользователей user_ids."""
+    ops = connection.ops
+    follow = Follow._meta.db_table
+    stats = UserStats._meta.db_table
+    # Пачка привязывается один раз: на старых SQLite не больше 999
+    # параметров в запросе
+    batch = ', '.join(['(%s)'] * len(user_ids))
+    # Подписчики популярных авторов похожи друг на друга мало
+    hubs = (f'SELECT user_id FROM {stats} '
+            f'WHERE followers_count > %s')
+    sql = f'''
+        {ops.insert_statement(ignore_conflicts=True)}
+        {FollowSuggestion._meta.db_table} (user_id, author_id, score, mutual)
+        WITH batch(id) AS (VALUES {batch})
+        SELECT user_id, author_id, score, mutual FROM (
+          SELECT user_id, author_id, score, mutual, ROW_NUMBER() OVER (
+            PARTITION BY user_id ORDER BY score DESC, author_id
+          ) AS position FROM (
+            SELECT user_id, author_id,
+                   SUM(friends) * %s + SUM(similarity) * %s AS score,
+                   SUM(friends) AS mutual
+            FROM (
+              SELECT f1.user_id, f2.author_id,
+                     1 AS friends, 0.0 AS similarity
+              FROM {follow} f1
+              JOIN {follow} f2 ON f2.user_id = f1.author_id
+              WHERE f1.user_id IN (SELECT id FROM batch)
+              UNION ALL
+              SELECT similar.user_id, f3.author_id,
+                     0, similar.similarity
+              FROM (
+                SELECT user_id, other_id, similarity, ROW_NUMBER() OVER (
+                  PARTITION BY user_id ORDER BY similarity DESC, other_id
+                ) AS position FROM (
+                  SELECT f1.user_id, f2.user_id AS other_id,
+                         COUNT(*) * 1.0 / NULLIF(
+                           su.following_count + sv.following_count
+                           - COUNT(*),
+                           0
+                         ) AS similarity
+                  FROM {follow} f1
+                  JOIN {follow} f2
+                    ON f2.author_id = f1.author_id
+                    AND f2.user_id != f1.user_id
+                  JOIN {stats} su ON su.user_id = f1.user_id
+                  JOIN {stats} sv ON sv.user_id = f2.user_id
+                  WHERE f1.user_id IN (SELECT id FROM batch)
+                    AND f1.author_id NOT IN ({hubs})
+                  GROUP BY f1.user_id, f2.user_id,
+                           su.following_count, sv.following_count
+                ) pairs
+              ) similar
+              JOIN {follow} f3 ON f3.user_id = similar.other_id
+              WHERE similar.position <= %s
+            ) candidates
+            WHERE author_id != user_id AND NOT EXISTS (
+              SELECT 1 FROM {follow} followed
+              WHERE followed.user_id = candidates.user_id
+                AND followed.author_id = candidates.author_id
+            )
+            GROUP BY user_id, author_id
+          ) scored
+        ) ranked
+        WHERE position <= %s
+        {ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}
+    '''
+    params = [
+        *user_ids,
+        settings.SUGGESTION_WEIGHTS['friends'],
+        settings.SUGGESTION_WEIGHTS['similarity'],
+        settings.SUGGESTION_HUB_FOLLOWERS,
+        settings.SUGGESTION_SIMILAR_USERS,
+        settings.SUGGESTIONS_PER_USER,
+    ]
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            created = cursor.rowcount
+    versions.bump(*(f'suggestions:{user_id}' for user_id in user_ids))
+    return created
+
+
+def mark_stale(user_ids, existing=False):
+    """Ставит пользователей в очередь инкрементального пересчёта;
+    existing=True пропускает уже удалённых."""
+    if existing:
+        user_ids = User.objects.filter(
+            pk__in=user_ids
+        ).values_list('pk', flat=True)
+    SuggestionQueue.objects.bulk_create(
+        [SuggestionQueue(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def stale_users():
+    """Пользователи из очереди и их подписчики: у последних изменились
+    друзья друзей. Возвращает (очередь, кого пересчитать)."""
+    queued = list(SuggestionQueue.objects.values_list('user_id', flat=True))
+    followers = Follow.objects.filter(
+        author_id__in=queued
+    ).values_list('user_id', flat=True)
+    return queued, sorted(set(queued).union(followers))
+
+
+def for_user(user, limit=None):
+    """Рекомендации пользователя одним запросом по индексу (user, -score).
+
+    Авторы, на которых подписались после расчёта, отбрасываются.
+    """
+    return FollowSuggestion.objects.filter(user=user).exclude(
+        author__in=Follow.objects.filter(user=user).values('author')
+    ).select_related('author').only(
+        'mutual', 'author', 'author__username', 'author__first_name',
+        'author__last_name',
+    ).order_by('-score')[:limit or settings.SUGGESTIONS_SHOWN]
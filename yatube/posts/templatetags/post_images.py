@@ -0,0 +1,16 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, geometry, **options):
+    """Миниатюра картинки поста без ресайза во время запроса.
+
+    Пока фоновая задача её не создала, отдаётся исходная картинка.
+    """
+    if not image:
+        return None
+    return thumbnails.ready_thumbnail(image, geometry, **options) or image
@@ -0,0 +1,49 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Post, TimelineEntry, UserStats
+from ..seed import seed_site
+
+
+class BenchmarkTest(TestCase):
+    def test_seed_site_keeps_counters_and_timelines(self):
+        """Наполнитель создаёт связные данные с пересчитанными счётчиками."""
+        created = seed_site(
+            users=5, groups=2, posts=30, comments=20, follows=6
+        )
+        self.assertEqual(len(created['posts']), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        for stats in UserStats.objects.filter(user__in=created['users']):
+            self.assertEqual(
+                stats.posts_count,
+                Post.objects.filter(author=stats.user_id).count(),
+            )
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count(),
+        )
+
+    def test_bench_views_writes_results(self):
+        """Замер пишет перцентили и число запросов по каждому
+        представлению."""
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'bench_views', '--in-place', '--users=5', '--posts=30',
+                '--comments=10', '--follows=6', '--requests=3',
+                '--warmup=1', f'--output={output.name}', stdout=StringIO(),
+            )
+            results = json.load(output)
+        self.assertEqual(
+            set(results['views']),
+            {'index', 'group_posts', 'profile', 'post_detail',
+             'follow_index', 'post_create', 'add_comment'},
+        )
+        for name, view in results['views'].items():
+            with self.subTest(view=name):
+                self.assertEqual(view['requests'], 3)
+                self.assertLessEqual(view['p50_ms'], view['p99_ms'])
+                self.assertGreater(view['queries_per_request'], 0)
@@ -1,12 +1,21 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
+from django.db import OperationalError, connection
+from django.test import (TestCase, TransactionTestCase, Client,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
 
+from posts import thumbnails
 from posts.models import Group, Post, Comment
 
 User = get_user_model()
@@ -121,6 +130,137 @@ class PostCreateFormTests(TestCase):
         )
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageLimitsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def make_image(self, size=(2, 1)):
+        buffer = BytesIO()
+        Image.new('RGB', size).save(buffer, 'PNG')
+        return SimpleUploadedFile(
+            name='image.png',
+            content=buffer.getvalue(),
+            content_type='image/png'
+        )
+
+    def post_image(self, image):
+        return self.author_client.post(
+            reverse('posts:create_post'),
+            data={'text': 'Пост с картинкой', 'image': image},
+        )
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=16)
+    def test_oversize_upload_rejected(self):
+        """Файл больше лимита отбрасывается при приёме."""
+        response = self.post_image(self.make_image())
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 16\xa0байт.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_too_many_pixels_rejected(self):
+        """Размер картинки проверяется по заголовку."""
+        response = self.post_image(self.make_image())
+        self.assertFormError(
+            response, 'form', 'image', 'В картинке больше 1 пикселей.'
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_huge_original_downscaled(self):
+        """Фоновая задача уменьшает слишком большой исходник."""
+        self.post_image(self.make_image((400, 200)))
+        post = Post.objects.get()
+        original = post.image.name
+        with mock.patch(
+            'django.db.transaction.on_commit', side_effect=lambda f: f()
+        ):
+            downscaled = thumbnails.downscale_original(original)
+        self.assertNotEqual(downscaled, original)
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, downscaled)
+        self.assertFalse(default_storage.exists(original))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_failed_downscale_keeps_original(self):
+        """Сбой записи уменьшенной копии не трогает исходник."""
+        self.post_image(self.make_image((400, 200)))
+        post = Post.objects.get()
+        with mock.patch.object(
+            default_storage, 'save', side_effect=OSError('диск заполнен')
+        ), self.assertRaises(OSError):
+            thumbnails.downscale_original(post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(default_storage.exists(post.image.name))
+
+
+@override_settings(SQLITE_BUSY_RETRIES=2, SQLITE_BUSY_BACKOFF=0,
+                   THUMBNAIL_PREGENERATE=False)
+class BusyWriteTests(TransactionTestCase):
+    """Повтор записи при занятой SQLite; TransactionTestCase, потому что
+    внутри транзакции TestCase повтор не включается."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        media_root = override_settings(MEDIA_ROOT=media)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.user = User.objects.create_user(username='busy')
+        self.client.force_login(self.user)
+
+    def test_form_page_takes_no_write_lock(self):
+        """Страница формы не открывает транзакцию на запись."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:create_post'))
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('BEGIN')
+        ])
+
+    def test_retry_stores_upload_once(self):
+        """Повтор записи поста не сохраняет картинку ещё раз."""
+        save = Post.save
+        attempts = []
+
+        def busy_once(post, *args, **kwargs):
+            # Первая попытка успевает записать пост и картинку
+            attempts.append(post)
+            save(post, *args, **kwargs)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+
+        image = BytesIO()
+        Image.new('RGB', (2, 1)).save(image, 'PNG')
+        with mock.patch.object(Post, 'save', busy_once), \
+                self.assertLogs('core.sqlite', 'WARNING'):
+            self.client.post(reverse('posts:create_post'), {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile('busy.png', image.getvalue(),
+                                            content_type='image/png'),
+            })
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertEqual(
+            os.listdir(os.path.join(settings.MEDIA_ROOT, 'posts')),
+            [os.path.basename(Post.objects.get().image.name)],
+        )
+
+
 class PostCommentTests(TestCase):
     @classmethod
     def setUpClass(cls):
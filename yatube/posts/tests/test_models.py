@@ -1,7 +1,12 @@
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from .. import counters
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -55,3 +60,95 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     task._meta.get_field(field).help_text, expected_value)
+
+    def test_card_urls_cached_on_instance(self):
+        """Адреса карточки поста вычисляются один раз на экземпляр."""
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(post.get_absolute_url(), f'/posts/{post.pk}/')
+            self.assertEqual(post.author_url, '/profile/auth/')
+            self.assertEqual(post.group_url, '/')
+        with mock.patch('posts.models.reverse') as reverse:
+            post.get_absolute_url()
+            post.author_url
+            post.group_url
+        reverse.assert_not_called()
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читаются по индексам без отдельной сортировки."""
+        call_command('explain_feeds', stdout=StringIO())
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """recount восстанавливает разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        UserStats.objects.update(posts_count=42)
+        Post.objects.update(comments_count=42)
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_decrement_of_drifted_counter_stops_at_zero(self):
+        """Удаление при разошедшемся счётчике не нарушает CHECK >= 0."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        UserStats.objects.update(posts_count=0)
+        Post.objects.update(comments_count=0)
+        Comment.objects.get().delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_stats_for_does_not_write(self):
+        """Без строки счётчиков stats_for считает их, ничего не создавая."""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).delete()
+        with self.assertNumQueries(2):
+            stats = counters.stats_for(self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertFalse(UserStats.objects.filter(user=self.author).exists())
+
+    def test_recount_query_count_does_not_grow(self):
+        """recount пишет счётчики всех пользователей двумя запросами."""
+        User.objects.bulk_create(
+            User(username=f'bulk{i}') for i in range(20)
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        users = User.objects.count()
+        with self.assertNumQueries(2):
+            self.assertEqual(counters.recount(), users)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(UserStats.objects.get(
+            user__username='bulk0'
+        ).posts_count, 0)
+        UserStats.objects.filter(user=self.author).delete()
+        counters.recount(User.objects.filter(stats__isnull=True))
+        self.assertEqual(self.stats(self.author).followers_count, 1)
@@ -0,0 +1,76 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from .. import suggestions
+from ..models import Follow, FollowSuggestion, SuggestionQueue
+from ..suggestions import for_user
+
+User = get_user_model()
+
+
+class SuggestionsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'a', 'b', 'c', 'd', 'e', 'twin')
+        }
+        for user, authors in (
+            ('reader', 'ab'), ('a', 'cd'), ('b', 'c'), ('twin', 'abe'),
+        ):
+            for author in authors:
+                Follow.objects.create(
+                    user=cls.users[user], author=cls.users[author]
+                )
+
+    def suggested(self):
+        return [
+            (suggestion.author.username, suggestion.mutual)
+            for suggestion in for_user(self.users['reader'], limit=10)
+        ]
+
+    def test_friends_of_friends_and_similar_readers(self):
+        """Рекомендуются авторы подписок и читатели со схожими
+        подписками, но не сам пользователь и не его подписки."""
+        call_command('compute_suggestions', stdout=StringIO())
+        suggested = self.suggested()
+        self.assertEqual(suggested[0], ('c', 2))
+        self.assertCountEqual(suggested, [('c', 2), ('e', 0), ('d', 1)])
+
+    def test_incremental_recompute(self):
+        """После подписки пересчитываются только затронутые пользователи."""
+        call_command('compute_suggestions', stdout=StringIO())
+        self.assertFalse(SuggestionQueue.objects.exists())
+        Follow.objects.create(
+            user=self.users['reader'], author=self.users['c']
+        )
+        self.assertNotIn('c', dict(self.suggested()))
+        output = StringIO()
+        call_command('compute_suggestions', stdout=output)
+        self.assertIn('Пользователей: 1,', output.getvalue())
+        self.assertEqual(
+            FollowSuggestion.objects.filter(
+                user=self.users['reader'], author=self.users['c']
+            ).count(),
+            0,
+        )
+
+    def test_batch_fits_sqlite_parameter_limit(self):
+        """Пачка по умолчанию укладывается в 999 параметров старых
+        SQLite."""
+        sizes = []
+
+        def count_params(execute, sql, params, many, context):
+            sizes.append(len(params or ()))
+            return execute(sql, params, many, context)
+
+        user_ids = [user.pk for user in self.users.values()] * 72
+        with connection.execute_wrapper(count_params):
+            suggestions.compute(user_ids[:500])
+        self.assertLessEqual(max(sizes), 999)
+        self.assertEqual(self.suggested()[0], ('c', 2))
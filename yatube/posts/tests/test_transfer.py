@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import (Comment, Follow, Group, Post, TimelineEntry,
+                      UserStats)
+
+User = get_user_model()
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост, "с кавычками"'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def round_trip(self, extension):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = {}
+        for name in ('group', 'post', 'comment', 'follow'):
+            paths[name] = os.path.join(directory, f'{name}.{extension}')
+            call_command('export_data', name, f'--output={paths[name]}',
+                         stderr=StringIO())
+        exported = list(Post.objects.values('pk', 'text', 'pub_date'))
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        call_command(
+            'import_data',
+            *(f'{name}={path}' for name, path in paths.items()),
+            stderr=StringIO(),
+        )
+        self.assertEqual(
+            list(Post.objects.values('pk', 'text', 'pub_date')), exported
+        )
+        post = Post.objects.get()
+        self.assertEqual(post.author.username, 'author')
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.comments_count, 1)
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author__username='author'
+        ).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=post.author).followers_count, 1
+        )
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+
+    def test_jsonl_round_trip(self):
+        """Выгрузка и загрузка JSON Lines сохраняют данные и связи."""
+        self.round_trip('jsonl')
+
+    def test_csv_round_trip(self):
+        """Выгрузка и загрузка CSV сохраняют данные и связи."""
+        self.round_trip('csv')
@@ -1,18 +1,61 @@
+import itertools
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django.conf import settings
 # from django.shortcuts import get_object_or_404
-from django.test import TestCase, Client
+from django.core.management import call_command
+from unittest import mock
+from django.db import connection, transaction
+from django.test import (TestCase, TransactionTestCase, Client,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from django import forms
 
-from ..models import Group, Post, Follow
+from utils import KeysetPaginator
+
+from .. import (cards, conditional, counters, follows, thumbnails, trending,
+                versions)
+from ..models import (Comment, Group, Post, Follow, TimelineEntry,
+                      TrendingEvent, TrendingPost, UserStats)
 
 User = get_user_model()
 
 
+@contextmanager
+def committed():
+    """Выполняет on_commit-обработчики блока, как при фиксации:
+    TestCase откатывает свою транзакцию и сам их не вызывает."""
+    start = len(connection.run_on_commit)
+    yield
+    for _, callback in connection.run_on_commit[start:]:
+        callback()
+
+
+class QueryBudgetMixin:
+    """Проверка, что страница укладывается в постоянное число запросов."""
+
+    def assertQueryBudget(self, client, url, budget):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries)
+        )
+
+
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -197,6 +240,67 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context['page_obj']), posts_count)
 
 
+class KeysetPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        for i in range(13):
+            Post.objects.create(
+                author=cls.user,
+                text='Тестовый пост' + str(i),
+            )
+
+    def test_index_pages_by_cursor(self):
+        """index листается по курсору без потерь и повторов."""
+        response = self.client.get(reverse('posts:posts_main'))
+        first_page = list(response.context['page_obj'])
+        self.assertEqual(len(first_page), settings.POSTS_ON_PAGE)
+        self.assertIsNone(response.context['previous_cursor'])
+        response = self.client.get(
+            reverse('posts:posts_main'),
+            {'after': response.context['next_cursor']}
+        )
+        second_page = list(response.context['page_obj'])
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(
+            first_page + second_page,
+            list(Post.objects.order_by('-pub_date', '-id'))
+        )
+        response = self.client.get(
+            reverse('posts:posts_main'),
+            {'before': response.context['previous_cursor']}
+        )
+        self.assertEqual(list(response.context['page_obj']), first_page)
+
+    def test_cursor_page_uses_index(self):
+        """Страница по курсору читается диапазоном индекса."""
+        post = Post.objects.order_by('-pub_date', '-id')[5]
+        for lookup in ('lt', 'gt'):
+            with self.subTest(lookup=lookup):
+                paginator = KeysetPaginator(
+                    Post.objects.for_feed(), settings.POSTS_ON_PAGE
+                )
+                order = ('-pub_date', '-pk') if lookup == 'lt' else (
+                    'pub_date', 'pk'
+                )
+                plan = Post.objects.for_feed().filter(
+                    paginator._keyset(post.pub_date, post.pk, lookup)
+                ).order_by(*order)[:settings.POSTS_ON_PAGE + 1].explain()
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertNotIn('SCAN posts_post', plan)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:posts_main'), {'after': 'broken'}
+        )
+        self.assertEqual(
+            response.context['page_obj'][0],
+            Post.objects.order_by('-pub_date', '-id')[0]
+        )
+
+
 class PostGroupTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -416,6 +520,304 @@ class FollowUnfollowTest(TestCase):
         )
 
 
+class FollowBatchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='onboarding')
+        cls.authors = [
+            User.objects.create_user(username=f'suggested{i}')
+            for i in range(10)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def batch(self, authors, action='follow'):
+        return self.client.post(reverse('posts:follow_batch'), {
+            'authors': [str(author) for author in authors],
+            'action': action,
+        }).json()
+
+    def assertCountersFresh(self):
+        expected = {
+            stats.pk: (stats.followers_count, stats.following_count)
+            for stats in UserStats.objects.all()
+        }
+        counters.recount()
+        self.assertEqual(expected, {
+            stats.pk: (stats.followers_count, stats.following_count)
+            for stats in UserStats.objects.all()
+        })
+
+    def test_follow_many_is_idempotent(self):
+        """Пакетная подписка пропускает себя, чужих и уже оформленные."""
+        result = self.batch(self.authors[:3] + [self.reader, 'nobody'])
+        self.assertEqual(result['changed'],
+                         [str(author) for author in self.authors[:3]])
+        self.assertEqual(result['unknown'], ['nobody'])
+        self.assertEqual(self.batch(self.authors[:3])['changed'], [])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertCountersFresh()
+
+    def test_query_count_does_not_grow_with_batch(self):
+        """Число запросов не зависит от числа авторов в пакете."""
+        # Первая подписка создаёт строку счётчиков читателя
+        self.batch(self.authors[:1])
+        with CaptureQueriesContext(connection) as few:
+            self.batch(self.authors[1:3])
+        with CaptureQueriesContext(connection) as many:
+            self.batch(self.authors[3:])
+        self.assertEqual(len(few), len(many))
+
+    def test_unfollow_many(self):
+        """Пакетная отписка убирает подписки, ленту и счётчики."""
+        self.batch(self.authors)
+        result = self.batch(self.authors[:4], action='unfollow')
+        self.assertEqual(len(result['changed']), 4)
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 6
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader, post__author__in=self.authors[:4]
+        ).exists())
+        self.assertCountersFresh()
+
+
+class FollowWriteLockTest(TransactionTestCase):
+    def test_follows_read_under_write_lock(self):
+        """Уже оформленные подписки читаются под блокировкой записи:
+        параллельная подписка не вклинится до вставки, и тренды
+        получают ровно вставленные строки."""
+        reader = User.objects.create_user(username='locked_reader')
+        authors = [
+            User.objects.create_user(username=f'locked{i}') for i in range(2)
+        ]
+        Follow.objects.create(user=reader, author=authors[0])
+        events = TrendingEvent.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            new = follows.follow_many(reader, [a.pk for a in authors])
+        self.assertEqual(new, [authors[1].pk])
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(statements[0], 'BEGIN IMMEDIATE')
+        self.assertEqual(TrendingEvent.objects.count(), events + 1)
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='trend_author')
+        cls.group = Group.objects.create(
+            title='Горячая группа', slug='hot', description='Описание'
+        )
+        cls.quiet = Post.objects.create(author=cls.user, text='Тихий пост')
+        cls.hot = Post.objects.create(
+            author=cls.user, group=cls.group, text='Горячий пост'
+        )
+
+    def comment(self, post, count=1):
+        for _ in range(count):
+            Comment.objects.create(post=post, author=self.user, text='!')
+
+    def test_trending_page_ranks_by_activity(self):
+        """Страница популярного упорядочена по активности."""
+        self.comment(self.quiet)
+        self.comment(self.hot, 3)
+        self.assertEqual(trending.aggregate(), 4)
+        self.assertFalse(TrendingEvent.objects.exists())
+        response = self.client.get(reverse('posts:trending'))
+        content = response.content.decode()
+        self.assertLess(content.index('Горячий пост'),
+                        content.index('Тихий пост'))
+        self.assertContains(response, 'Горячая группа')
+
+    def test_older_activity_decays(self):
+        """Давняя активность весит меньше свежей."""
+        self.comment(self.quiet, 3)
+        TrendingEvent.objects.update(
+            created=timezone.now()
+            - timedelta(seconds=settings.TRENDING_HALF_LIFE * 2)
+        )
+        self.comment(self.hot, 1)
+        trending.aggregate()
+        self.assertEqual(trending.top_posts(), [self.hot, self.quiet])
+
+    @override_settings(TRENDING_SIZE=1)
+    def test_sorted_set_is_bounded(self):
+        """Хранится не больше TRENDING_SIZE постов."""
+        self.comment(self.quiet)
+        self.comment(self.hot, 2)
+        trending.aggregate()
+        self.assertEqual(
+            list(TrendingPost.objects.values_list('post', flat=True)),
+            [self.hot.pk],
+        )
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etag_author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='etag-group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Каждая запись в versions на секунду позже предыдущей, а ответы
+        # отдаются, когда все эти секунды уже прошли
+        clock = itertools.count(time.time_ns(), 10 ** 9)
+        for target, name, value in (
+            (versions, 'fresh', lambda: next(clock)),
+            (conditional, 'now', lambda: time.time() + 3600),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.urls = (
+            reverse('posts:posts_main'),
+            reverse('posts:posts_group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        )
+
+    def test_not_modified_before_rendering(self):
+        """Совпавший ETag — 304 без запросов страницы."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertTrue(response.has_header('Last-Modified'))
+                # Главной хватает кэша, остальным нужен id объекта
+                with self.assertNumQueries(0 if url == self.urls[0] else 1):
+                    cached = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(cached['ETag'], response['ETag'])
+                self.assertEqual(cached.content, b'')
+
+    def modified_since(self, dates):
+        return {
+            url: self.client.get(url, HTTP_IF_MODIFIED_SINCE=date).status_code
+            for url, date in dates.items()
+        }
+
+    def test_if_modified_since(self):
+        """Правка, удаление комментария и правка группы сдвигают
+        Last-Modified."""
+        dates = {url: self.client.get(url)['Last-Modified']
+                 for url in self.urls}
+        self.assertEqual(set(self.modified_since(dates).values()), {304})
+        self.post.text = 'Исправленный пост'
+        with committed():
+            self.post.save()
+        self.assertEqual(set(self.modified_since(dates).values()), {200})
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='!'
+        )
+        detail = self.urls[-1]
+        dates = {detail: self.client.get(detail)['Last-Modified']}
+        with committed():
+            comment.delete()
+        self.assertEqual(self.modified_since(dates)[detail], 200)
+        dates = {url: self.client.get(url)['Last-Modified']
+                 for url in self.urls}
+        self.group.title = 'Новое название'
+        with committed():
+            self.group.save()
+        self.assertEqual(set(self.modified_since(dates).values()), {200})
+
+    def test_no_last_modified_for_user(self):
+        """Страницы для вошедшего пользователя сверяются только по ETag."""
+        self.client.force_login(self.user)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertFalse(response.has_header('Last-Modified'))
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                ).status_code, 304)
+
+    def test_login_again_produces_new_etag(self):
+        """После повторного входа форма комментария приходит с новым
+        CSRF-токеном, а не из кэша браузера."""
+        User.objects.create_user(username='etag_reader', password='pass')
+        credentials = {'username': 'etag_reader', 'password': 'pass'}
+        detail = self.urls[-1]
+        self.client.post(reverse('users:login'), credentials)
+        etag = self.client.get(detail)['ETag']
+        self.assertEqual(
+            self.client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.client.get(reverse('users:logout'))
+        self.client.post(reverse('users:login'), credentials)
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_no_last_modified_within_write_second(self):
+        """В секунду последней записи Last-Modified не отправляется."""
+        self.client.get(self.urls[0])
+        generation, stamp = versions.state('posts')
+        with mock.patch.object(conditional, 'now',
+                               return_value=stamp / 10 ** 9):
+            response = self.client.get(self.urls[0])
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_changes_produce_new_etag(self):
+        """Правка поста, комментарий, правка группы и вход меняют ETag."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.post.text = 'Исправленный пост'
+        with committed():
+            self.post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Исправленный пост')
+        detail = self.urls[-1]
+        etag = self.client.get(detail)['ETag']
+        with committed():
+            Comment.objects.create(
+                post=self.post, author=self.user, text='!'
+            )
+        self.assertEqual(
+            self.client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.group.description = 'Новое описание'
+        with committed():
+            self.group.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(self.client.get(self.urls[1]), 'Новое описание')
+        etag = self.client.get(detail)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_missing_object_has_no_validators(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id + 100,))
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
 class CacheViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -439,27 +841,402 @@ class CacheViewsTest(TestCase):
         self.authorized_client.force_login(self.user)
 
     def test_cahe_index_page_post(self):
-        """при удалении записи из базы, она остаётся в response.content
-        главной страницы.
+        """главная страница отдаётся из кэша, пока данные не менялись.
         """
         response = self.authorized_client.get(
             reverse('posts:posts_main')
         )
         first_object = response.context['page_obj'][0]
-        self.assertEqual(response.context['page_obj'][0], first_object)
         cont_1 = response.content
         self.assertTrue(cont_1)
-        first_object.delete()
+        Post.objects.filter(pk=first_object.pk).update(text='Без сигналов')
         response2 = self.authorized_client.get(
             reverse('posts:posts_main')
         )
-        cont_2 = response2.content
-        self.assertTrue(cont_2)
-        self.assertEqual(cont_1, cont_2)
+        self.assertEqual(cont_1, response2.content)
         cache.clear()
         response3 = self.authorized_client.get(
             reverse('posts:posts_main')
         )
-        cont_3 = response3.content
-        self.assertTrue(cont_3)
-        self.assertNotEqual(cont_1, cont_3)
+        self.assertNotEqual(cont_1, response3.content)
+
+    def test_cache_index_page_invalidated_on_delete(self):
+        """удалённая запись сразу пропадает с главной страницы."""
+        response = self.authorized_client.get(
+            reverse('posts:posts_main')
+        )
+        first_object = response.context['page_obj'][0]
+        with committed():
+            first_object.delete()
+        response2 = self.authorized_client.get(
+            reverse('posts:posts_main')
+        )
+        self.assertNotContains(response2, first_object.text + '<')
+
+    def test_cache_post_detail_invalidated_on_comment(self):
+        """новый комментарий сразу виден на странице поста."""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        self.authorized_client.get(url)
+        with committed():
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Свежий комментарий'
+            )
+        self.assertContains(
+            self.authorized_client.get(url), 'Свежий комментарий'
+        )
+
+
+class GenerationOnCommitTest(TransactionTestCase):
+    def test_generation_moves_after_commit(self):
+        """Поколение фрагментов меняется только после фиксации записи."""
+        user = User.objects.create_user(username='committer')
+        before = versions.generation('posts', f'author:{user.pk}')
+        with transaction.atomic():
+            post = Post.objects.create(author=user, text='Пост')
+            Comment.objects.create(post=post, author=user, text='!')
+            self.assertEqual(
+                versions.generation('posts', f'author:{user.pk}'), before
+            )
+        self.assertNotEqual(
+            versions.generation('posts', f'author:{user.pk}'), before
+        )
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='card_author')
+        for i in range(3):
+            Post.objects.create(author=cls.user, text=f'Карточка {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self):
+        return list(Post.objects.for_feed())
+
+    def test_cached_cards_fetched_with_one_get_many(self):
+        """Повторная страница собирается из кэша без отрисовки карточек."""
+        first = cards.render_cards(self.feed())
+        with mock.patch.object(cache, 'get_many',
+                               wraps=cache.get_many) as get_many, \
+                mock.patch('posts.cards.get_template') as get_template:
+            self.assertEqual(cards.render_cards(self.feed()), first)
+        get_many.assert_called_once()
+        get_template.return_value.render.assert_not_called()
+
+    def test_changed_post_rerendered(self):
+        """Изменённый пост получает новую карточку, остальные — из кэша."""
+        cards.render_cards(self.feed())
+        Post.objects.filter(text='Карточка 1').update(text='Правка')
+        with mock.patch.object(cache, 'set_many',
+                               wraps=cache.set_many) as set_many:
+            html = cards.render_cards(self.feed())
+        (fresh, _), _ = set_many.call_args
+        self.assertEqual(len(fresh), 1)
+        self.assertIn('Правка', ''.join(html))
+
+
+@override_settings(COMMENTS_ON_PAGE=3)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Популярный')
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий №{i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_bounded(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,))
+        )
+        for i in (4, 3, 2):
+            self.assertContains(response, f'Комментарий №{i}')
+        self.assertNotContains(response, 'Комментарий №1')
+        self.assertContains(response, 'id="more-comments"')
+
+    def test_json_endpoint_loads_next_page(self):
+        """Следующие комментарии подгружаются по курсору в JSON."""
+        url = reverse('posts:comments', args=(self.post.id,))
+        first = self.client.get(url).json()
+        self.assertIn('Комментарий №2', first['html'])
+        self.assertIsNotNone(first['next'])
+        with self.assertNumQueries(2):
+            second = self.client.get(first['next']).json()
+        self.assertIn('Комментарий №1', second['html'])
+        self.assertIn('Комментарий №0', second['html'])
+        self.assertNotIn('Комментарий №2', second['html'])
+        self.assertIsNone(second['next'])
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed_texts(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_fills_timeline(self):
+        """Подписка добавляет в ленту старые и новые посты автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(
+            self.feed_texts(), ['Новый пост', 'Пост до подписки']
+        )
+
+    def test_unfollow_clears_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        follow.delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(self.feed_texts(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_high_fanout_author_read_on_demand(self):
+        """Посты авторов с большой аудиторией читаются без рассылки."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(
+            self.feed_texts(), ['Новый пост', 'Пост до подписки']
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_back_under_limit_is_backfilled(self):
+        """Посты времени без рассылки возвращаются в ленты, когда
+        подписчиков снова не больше лимита."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        Post.objects.create(author=self.author, text='Пост без рассылки')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__text='Пост без рассылки')
+            .exists()
+        )
+        follows.unfollow_many(other, [self.author.pk])
+        self.assertEqual(
+            self.feed_texts(), ['Пост без рассылки', 'Пост до подписки']
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    def test_backfill_command(self):
+        """backfill_timelines восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_texts(), ['Пост до подписки'])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.books = Post.objects.create(
+            author=cls.author,
+            text='Читаю интересные книги по вечерам',
+        )
+        cls.cats = Post.objects.create(
+            author=cls.author,
+            text='Кошки спят весь день',
+        )
+
+    def found(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_stems_russian_words(self):
+        """Поиск находит пост по другой форме слова."""
+        self.assertEqual(self.found('книгами'), [self.books.pk])
+        self.assertEqual(self.found('интересная книга'), [self.books.pk])
+        self.assertEqual(self.found('книга про кошек'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Изменение и удаление поста сразу видны в поиске."""
+        self.cats.text = 'Собаки спят весь день'
+        self.cats.save()
+        self.assertEqual(self.found('кошки'), [])
+        self.assertEqual(self.found('собака'), [self.cats.pk])
+        self.cats.delete()
+        self.assertEqual(self.found('собака'), [])
+
+    def test_comments_are_searchable_and_ranked_lower(self):
+        """Комментарии ищутся, но совпадение в тексте поста выше."""
+        Comment.objects.create(
+            post=self.cats, author=self.author, text='Хорошие книги'
+        )
+        self.assertEqual(
+            self.found('книги'), [self.books.pk, self.cats.pk]
+        )
+
+    def test_comment_indexed_on_its_own(self):
+        """Запись комментария не перечитывает остальные комментарии."""
+        for i in range(3):
+            Comment.objects.create(
+                post=self.cats, author=self.author, text=f'Мяу {i}'
+            )
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                post=self.cats, author=self.author, text='Рыжий кот'
+            )
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'posts_comment' in query['sql']
+        ])
+        self.assertEqual(self.found('рыжий'), [self.cats.pk])
+        comment.delete()
+        self.assertEqual(self.found('рыжий'), [])
+        self.assertEqual(self.found('мяу'), [self.cats.pk])
+
+    def test_results_escape_post_text(self):
+        """Текст найденного поста выводится экранированным."""
+        Post.objects.create(
+            author=self.author, text='Книга <script>alert(1)</script>'
+        )
+        response = self.client.get(reverse('posts:search'), {'q': 'книга'})
+        self.assertNotContains(response, '<script>alert(1)')
+        self.assertContains(response, '&lt;script&gt;alert(1)')
+
+    def test_results_are_paginated(self):
+        """Результаты листаются страницами с сохранением запроса."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Книга номер {i}')
+            for i in range(settings.POSTS_ON_PAGE + 2)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'книга'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, settings.POSTS_ON_PAGE + 3)
+        self.assertEqual(len(page_obj), settings.POSTS_ON_PAGE)
+        self.assertContains(
+            response, '?q=%D0%BA%D0%BD%D0%B8%D0%B3%D0%B0&amp;page=2'
+        )
+        self.assertEqual(len(self.found('книга', page=2)), 3)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(settings.POSTS_ON_PAGE)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.post = Post.objects.create(
+                author=author,
+                group=cls.group,
+                text='Тестовый пост',
+            )
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_pages_query_budget(self):
+        """Число запросов страниц не зависит от числа постов."""
+        # группа, профиль и пост читают ещё id объекта для валидаторов 304
+        budgets = {
+            reverse('posts:posts_main'): 3,
+            reverse('posts:posts_group_list', args=(self.group.slug,)): 5,
+            # профиль и лента подписок читают ещё рекомендации
+            reverse('posts:profile', args=(self.authors[0],)): 8,
+            reverse('posts:follow_index'): 6,
+            reverse('posts:post_detail', args=(self.post.id,)): 6,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.reader_client, url, budget)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PregeneratedThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_request_does_not_resize(self):
+        """Без готовой миниатюры страница отдаёт исходную картинку."""
+        response = self.client.get(reverse('posts:posts_main'))
+        self.assertContains(response, self.post.image.url)
+
+    def test_pregenerated_thumbnail_is_served(self):
+        """Созданная заранее миниатюра выводится вместо исходной."""
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.ready_thumbnail(
+            self.post.image, '960x339', crop='center', upscale=True
+        )
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:posts_main'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
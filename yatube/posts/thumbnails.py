@@ -0,0 +1,135 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.images import ImageFile
+
+from . import versions
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class LookupThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, умеющий искать готовую миниатюру
+    без её создания."""
+
+    def lookup(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def downscale_original(name):
+    """Уменьшает исходник больше POST_IMAGE_MAX_SIDE.
+
+    Копия пишется под новым именем, посты переводятся на неё, а старый
+    файл удаляется после фиксации: ни сбой записи, ни параллельный
+    запрос не застают пост без картинки. Возвращает новое имя или None.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name) as source, Image.open(source) as image:
+        if (
+            max(image.size) <= max_side
+            or getattr(image, 'is_animated', False)
+        ):
+            return None
+        image_format = image.format
+        image.thumbnail((max_side, max_side))
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, optimize=True)
+    new_name = default_storage.save(name, ContentFile(buffer.getvalue()))
+    with transaction.atomic():
+        posts = list(Post.objects.filter(image=name).values_list(
+            'pk', 'author_id', 'group_id'
+        ))
+        Post.objects.filter(image=name).update(image=new_name)
+        if not posts:
+            # Пост удалили или сменили картинку, пока шло уменьшение
+            transaction.on_commit(lambda: default_storage.delete(new_name))
+            return None
+        scopes = {'posts'}
+        for pk, author_id, group_id in posts:
+            scopes.update({f'post:{pk}', f'author:{author_id}'})
+            if group_id:
+                scopes.add(f'group:{group_id}')
+        versions.bump(*scopes)
+        transaction.on_commit(lambda: default_storage.delete(name))
+    return new_name
+
+
+def generate(name):
+    """Уменьшает исходник и создаёт все миниатюры
+    из settings.POST_THUMBNAILS для картинки."""
+    try:
+        image = downscale_original(name) or name
+        for geometry, options in settings.POST_THUMBNAILS:
+            get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+    return name
+
+
+def _run_in_pool(name):
+    try:
+        generate(name)
+    finally:
+        connection.close()
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def schedule(name):
+    """Ставит создание миниатюр в очередь после фиксации транзакции."""
+    if not name or not settings.THUMBNAIL_PREGENERATE:
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    transaction.on_commit(lambda: executor().submit(_run_in_pool, name))
+
+
+def ready_thumbnail(image, geometry, **options):
+    """Готовая миниатюра или None; отсутствующая ставится в очередь."""
+    thumbnail = default.backend.lookup(image, geometry, **options)
+    if thumbnail is None:
+        schedule(image.name)
+    return thumbnail
@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Prefetch
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+
+def high_fanout_authors(authors):
+    """Авторы из authors, у которых подписчиков больше лимита рассылки."""
+    return UserStats.objects.filter(
+        user__in=authors,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('user')
+
+
+def is_high_fanout(author):
+    return high_fanout_authors([author]).exists()
+
+
+def follows_high_fanout(user):
+    return high_fanout_authors(
+        Follow.objects.filter(user=user).values('author')
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты подписчиков автора.
+
+    Посты авторов с большим числом подписчиков не раскладываются:
+    их читатели получают ленту выборкой при чтении. Граница берётся
+    из UserStats, как и в feed(), чтобы они не расходились.
+    """
+    if is_high_fanout(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """Добавляет в ленту user последние посты author."""
+    if is_high_fanout(author):
+        return
+    posts = Post.objects.filter(author=author).values_list(
+        'id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL_POSTS]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill_all(user_id=None, author_ids=None):
+    """backfill() для всех подписок сразу, одним INSERT … SELECT.
+
+    Нужна после массовой загрузки, когда сигналы не вызывались.
+    user_id и author_ids ограничивают заполнение подписками одного
+    пользователя на этих авторов.
+    """
+    ops = connection.ops
+    posts_where, follows_where, params = '', '', []
+    if author_ids is not None:
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        posts_where = f'WHERE author_id IN ({placeholders})'
+        params += author_ids
+    params += [settings.TIMELINE_BACKFILL_POSTS,
+               settings.TIMELINE_FANOUT_LIMIT]
+    if user_id is not None:
+        follows_where = 'AND follow.user_id = %s'
+        params.append(user_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow JOIN ('
+            f'  SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            f'    PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f'  ) AS position FROM {Post._meta.db_table} {posts_where}'
+            f') post ON post.author_id = follow.author_id '
+            f'WHERE post.position <= %s AND follow.author_id NOT IN ('
+            f'  SELECT user_id FROM {UserStats._meta.db_table}'
+            f'  WHERE followers_count > %s'
+            f') {follows_where} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params,
+        )
+        return cursor.rowcount
+
+
+def catch_up(author_ids):
+    """Авторы, у которых подписчиков снова стало не больше лимита,
+    раскладываются по лентам заново.
+
+    Их посты времени без рассылки в ленты не попадали; подписчики
+    получают последние TIMELINE_BACKFILL_POSTS, как при подписке.
+    Вызывается после уменьшения followers_count.
+    """
+    authors = list(UserStats.objects.filter(
+        user__in=author_ids,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+    if authors:
+        backfill_all(author_ids=authors)
+
+
+def drop(user, author):
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def feed(user):
+    """Лента подписок: готовая выборка из TimelineEntry или,
+    если пользователь читает авторов с большой аудиторией,
+    выборка постов при чтении.
+    """
+    if follows_high_fanout(user):
+        return Post.objects.for_feed().filter(
+            author__in=Follow.objects.values('author').filter(user=user)
+        )
+    return user.timeline.prefetch_related(
+        Prefetch('post', queryset=Post.objects.for_feed())
+    )
+
+
+def posts_of(page_obj):
+    """Заменяет записи ленты на их посты на странице."""
+    page_obj.object_list = [
+        getattr(item, 'post', item) for item in page_obj.object_list
+    ]
+    return page_obj
+
+
+def drop_many(user_id, author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author__in=author_ids
+    ).delete()
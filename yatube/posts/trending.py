@@ -0,0 +1,142 @@
+"""Популярные посты и группы с экспоненциальным затуханием.
+
+Вклад события с весом w в момент t затухает как
+w·exp(-λ·(now - t)), λ = ln 2 / TRENDING_HALF_LIFE. Общий множитель
+exp(-λ·now) одинаков для всех, поэтому для порядка достаточно
+хранить log Σ w·exp(λ·(t - EPOCH)): значение только растёт с новыми
+событиями и не требует пересчёта со временем. В логарифмической
+шкале оно не переполняется.
+
+Сигналы пишут события в TrendingEvent; aggregate() забирает их
+пачками по порядку, складывает в TrendingPost и TrendingGroup и
+удаляет обработанные. Таблицы оценок ограничены TRENDING_SIZE
+строками — это готовое отсортированное множество для страницы.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import Post, TrendingEvent, TrendingGroup, TrendingPost, User
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def heat(weight, at):
+    decay = math.log(2) / settings.TRENDING_HALF_LIFE
+    return math.log(weight) + decay * (at - EPOCH).total_seconds()
+
+
+def combine(first, second):
+    """log(e^first + e^second) без переполнения."""
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def record_comment(post_id):
+    TrendingEvent.objects.create(
+        post_id=post_id, weight=settings.TRENDING_WEIGHTS['comment']
+    )
+
+
+def record_follows(author_ids):
+    TrendingEvent.objects.bulk_create([
+        TrendingEvent(
+            author_id=author_id, weight=settings.TRENDING_WEIGHTS['follow']
+        )
+        for author_id in author_ids
+    ])
+
+
+def latest_posts(author_ids):
+    """Последний пост каждого автора: подписка поднимает его."""
+    latest = Post.objects.filter(author=OuterRef('pk')).order_by(
+        '-pub_date', '-pk'
+    ).values('pk')[:1]
+    return dict(
+        User.objects.filter(pk__in=author_ids)
+        .annotate(post_id=Subquery(latest))
+        .values_list('pk', 'post_id')
+    )
+
+
+def merge(model, field, deltas):
+    """Прибавляет deltas {id: heat} к оценкам model тремя запросами."""
+    rows = model.objects.in_bulk(list(deltas))
+    for pk, delta in deltas.items():
+        if pk in rows:
+            rows[pk].score = combine(rows[pk].score, delta)
+    model.objects.bulk_update(rows.values(), ['score'])
+    model.objects.bulk_create([
+        model(**{f'{field}_id': pk, 'score': delta})
+        for pk, delta in deltas.items() if pk not in rows
+    ])
+
+
+def prune(model):
+    """Оставляет TRENDING_SIZE лучших строк."""
+    threshold = model.objects.order_by('-score').values_list(
+        'score', flat=True
+    )[settings.TRENDING_SIZE:settings.TRENDING_SIZE + 1]
+    if threshold:
+        model.objects.filter(score__lte=threshold[0]).delete()
+
+
+def apply(events):
+    authors = {event['author_id'] for event in events if event['author_id']}
+    latest = latest_posts(authors) if authors else {}
+    groups = dict(
+        Post.objects.filter(pk__in=set(latest.values()) - {None})
+        .values_list('pk', 'group_id')
+    )
+    posts, group_heat = {}, {}
+    for event in events:
+        post_id = event['post_id'] or latest.get(event['author_id'])
+        if post_id is None:
+            continue
+        group_id = event['post__group'] or groups.get(post_id)
+        value = heat(event['weight'], event['created'])
+        posts[post_id] = combine(posts.get(post_id), value)
+        if group_id:
+            group_heat[group_id] = combine(group_heat.get(group_id), value)
+    merge(TrendingPost, 'post', posts)
+    merge(TrendingGroup, 'group', group_heat)
+
+
+def aggregate(batch_size=5000):
+    """Обрабатывает накопившиеся события; возвращает их число."""
+    total = 0
+    while True:
+        events = list(
+            TrendingEvent.objects.order_by('pk').values(
+                'pk', 'post_id', 'post__group', 'author_id', 'weight',
+                'created',
+            )[:batch_size]
+        )
+        if not events:
+            break
+        with transaction.atomic():
+            apply(events)
+            TrendingEvent.objects.filter(pk__lte=events[-1]['pk']).delete()
+        total += len(events)
+    prune(TrendingPost)
+    prune(TrendingGroup)
+    return total
+
+
+def top_posts(limit=None):
+    return [
+        trending.post for trending in TrendingPost.objects.select_related(
+            'post__author', 'post__group'
+        ).order_by('-score')[:limit or settings.TRENDING_POSTS_SHOWN]
+    ]
+
+
+def top_groups(limit=None):
+    return TrendingGroup.objects.select_related('group').order_by(
+        '-score'
+    )[:limit or settings.TRENDING_GROUPS_SHOWN]
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class RejectedUpload(UploadedFile):
+    """Заглушка вместо файла, отброшенного из-за размера."""
+    rejected = True
+
+    def __init__(self, name, content_type):
+        super().__init__(name=name, content_type=content_type, size=0)
+
+
+class SizeLimitedUploadHandler(FileUploadHandler):
+    """Отбрасывает файлы больше settings.POST_IMAGE_MAX_UPLOAD_SIZE.
+
+    Должен стоять первым в FILE_UPLOAD_HANDLERS. Решение принимается по
+    Content-Length запроса и части, а затем по сумме принятых кусков;
+    байты отброшенного файла не передаются следующим обработчикам
+    и нигде не накапливаются.
+    """
+    request_too_large = False
+    rejected = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        self.request_too_large = content_length > (
+            settings.POST_IMAGE_MAX_UPLOAD_SIZE
+            + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        )
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        super().new_file(
+            field_name, file_name, content_type, content_length,
+            charset, content_type_extra,
+        )
+        self.rejected = self.request_too_large or (
+            content_length is not None
+            and content_length > settings.POST_IMAGE_MAX_UPLOAD_SIZE
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.rejected = True
+        if self.rejected:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUpload(self.file_name, self.content_type)
+        return None
@@ -6,14 +6,20 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='posts_main'),
-    path('group/<slug:slug>/', views.group_posts, name='posts_group_list'),
+    path('group/<slug:slug>/', views.group_posts,
+         name='posts_group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='create_post'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/comments/',
+         views.comments, name='comments'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/batch/', views.follow_batch, name='follow_batch'),
+    path('search/', views.search, name='search'),
+    path('trending/', views.trending_posts, name='trending'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def key(scope):
+    return f'generation:{scope}'
+
+
+def fresh():
+    # Начальное значение от времени: после потери счётчика в кэше
+    # новое поколение не совпадёт ни с одним из прежних.
+    return time.time_ns()
+
+
+def stamp_key(scope):
+    return f'modified:{scope}'
+
+
+def values(keys):
+    """Значения keys из кэша одним обращением; потерянные заводятся
+    заново от текущего времени."""
+    found = cache.get_many(keys)
+    for missing in set(keys) - set(found):
+        cache.add(missing, fresh(), timeout=None)
+        found[missing] = cache.get(missing)
+    return [found[k] for k in keys]
+
+
+def generation(*scopes):
+    """Версия данных для ключа фрагмента.
+
+    scopes: 'posts', 'group:<id>', 'author:<id>', 'post:<id>',
+    'follow:<user_id>', 'suggestions:<user_id>'. Запись увеличивает
+    поколение области, и старые фрагменты перестают запрашиваться.
+    """
+    return '.'.join(str(value) for value in values(
+        [key(scope) for scope in scopes]
+    ))
+
+
+def state(*scopes):
+    """Поколение областей scopes и время последней записи в них (нс)."""
+    found = values(
+        [key(scope) for scope in scopes]
+        + [stamp_key(scope) for scope in scopes]
+    )
+    generations, stamps = found[:len(scopes)], found[len(scopes):]
+    return '.'.join(str(value) for value in generations), max(stamps)
+
+
+def bump(*scopes):
+    """Увеличивает поколения после фиксации транзакции.
+
+    Раньше нельзя: параллельный запрос прочитал бы старые строки,
+    закэшировал бы их под новым поколением и раздавал бы новый ETag.
+    Вне транзакции поколения увеличиваются сразу.
+    """
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    cache.set_many(
+        {stamp_key(scope): fresh() for scope in scopes}, timeout=None
+    )
+    for scope in scopes:
+        try:
+            cache.incr(key(scope))
+        except ValueError:
+            cache.set(key(scope), fresh(), timeout=None)
+
+
+def fragment_context(*scopes):
+    return {
+        'cache_version': generation(*scopes),
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    }
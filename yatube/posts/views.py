@@ -1,33 +1,54 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import require_POST
 
-from utils import pagination
+from core.db_router import replica_reads
+from core.sqlite import retry_on_busy
+from utils import KeysetPaginator, decode_cursor, pagination
+from . import (conditional, counters, follows, suggestions, timeline,
+               trending, versions)
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Comment, Group, Post, User, Follow
+from .search import search as search_posts
 
 
+@replica_reads
+@conditional.conditional(conditional.index)
 def index(request):
-    post_list = Post.objects.select_related('group').all()
-    context = pagination(post_list, request)
+    post_list = Post.objects.for_feed()
+    context = pagination(post_list, request, keyset=True)
+    context.update(versions.fragment_context('posts'))
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@conditional.conditional(conditional.group_posts)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = Post.objects.for_feed().filter(group=group)
     context = {
         'group': group,
     }
-    context.update(pagination(post_list, request))
+    context.update(pagination(post_list, request, keyset=True))
+    context.update(versions.fragment_context(f'group:{group.pk}'))
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@conditional.conditional(conditional.profile)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
-    posts_count = author.posts.count()
+    post_list = Post.objects.for_feed().filter(author=author)
+    posts_count = counters.stats_for(author).posts_count
     context = {
         'author': author,
         'posts_count': posts_count,
@@ -37,17 +58,27 @@ def profile(request, username):
             user=request.user,
             author=author
         ).exists()
-        context.update({'following': following, })
-    context.update(pagination(post_list, request))
+        context.update({
+            'following': following,
+            'suggestions': suggestions.for_user(request.user),
+        })
+    context.update(
+        pagination(post_list, request, keyset=True, count=posts_count)
+    )
+    context.update(versions.fragment_context(f'author:{author.pk}'))
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+@conditional.conditional(conditional.post_detail)
 def post_detail(request, post_id):
-    post_obj = get_object_or_404(Post, id=post_id)
-    post_count = Post.objects.filter(author=post_obj.author).count()
+    post_obj = get_object_or_404(Post.objects.for_feed(), id=post_id)
+    post_count = counters.stats_for(post_obj.author).posts_count
     current_user = request.user
     form = CommentForm(request.POST or None)
-    comments = post_obj.comments.all()
+    cursor = request.GET.get('comments_after', '')
+    # Читаются, только если фрагмент комментариев не нашёлся в кэше
+    comments = SimpleLazyObject(lambda: comment_page(post_obj.pk, cursor))
     context = {
         'post_id': post_id,
         'post_obj': post_obj,
@@ -55,10 +86,59 @@ def post_detail(request, post_id):
         'current_user': current_user,
         'form': form,
         'comments': comments,
+        'comments_cursor': cursor,
+        **versions.fragment_context(
+            f'post:{post_obj.pk}', f'author:{post_obj.author_id}'
+        ),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comment_page(post_id, cursor=''):
+    """Страница комментариев поста, новые первыми, с авторами одним
+    JOIN; листается курсором по (created, id)."""
+    query = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only('text', 'created', 'post', 'author', 'author__username')
+    paginator = KeysetPaginator(
+        query, settings.COMMENTS_ON_PAGE, field='created'
+    )
+    page_obj, next_cursor, _ = paginator.keyset_page(
+        after=decode_cursor(cursor)
+    )
+    return {
+        'object_list': page_obj.object_list,
+        'next_cursor': next_cursor,
+    }
+
+
+@replica_reads
+def comments(request, post_id):
+    """Следующая страница комментариев для подгрузки на странице поста:
+    готовый HTML и адрес следующей страницы."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    page = comment_page(post.pk, request.GET.get('after', ''))
+    next_url = None
+    if page['next_cursor']:
+        next_url = '{}?{}'.format(
+            reverse('posts:comments', args=[post.pk]),
+            urlencode({'after': page['next_cursor']}),
+        )
+    return JsonResponse({
+        'html': render_to_string(
+            'includes/comment_list.html', {'comments': page}, request
+        ),
+        'next': next_url,
+    })
+
+
+def save_post(post):
+    # Картинка уходит в хранилище до записи в базу: повтор записи при
+    # занятой SQLite не должен сохранять её ещё раз
+    Post._meta.get_field('image').pre_save(post, post._state.adding)
+    retry_on_busy(post.save)()
+
+
 @login_required
 def post_create(request):
     is_edit = False
@@ -66,7 +146,7 @@ def post_create(request):
     if form.is_valid():
         post_inst = form.save(commit=False)
         post_inst.author = request.user
-        post_inst.save()
+        save_post(post_inst)
         return redirect('posts:profile', request.user)
     return render(
         request,
@@ -87,7 +167,7 @@ def post_edit(request, post_id):
         instance=post_inst
     )
     if form.is_valid():
-        form.save()
+        save_post(form.save(commit=False))
         return redirect('posts:post_detail', post_id)
     return render(
         request,
@@ -104,38 +184,78 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        retry_on_busy(comment.save)()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    followings = Follow.objects.values('author').filter(
-        user=request.user)
-    post_list = Post.objects.filter(author__in=followings)
-    context = pagination(post_list, request)
+    context = pagination(timeline.feed(request.user), request, keyset=True)
+    timeline.posts_of(context['page_obj'])
+    context.update(versions.fragment_context(
+        f'follow:{request.user.pk}', 'posts'
+    ))
+    context['suggestions'] = suggestions.for_user(request.user)
     return render(request, 'posts/follow.html', context)
 
 
+@replica_reads
+def trending_posts(request):
+    return render(request, 'posts/trending.html', {
+        'posts': trending.top_posts(),
+        'groups': trending.top_groups(),
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    if query:
+        context.update(pagination(search_posts(query), request))
+        context['page_query'] = urlencode({'q': query}) + '&'
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if author != request.user:
-        new_following, created = Follow.objects.get_or_create(
-            user=request.user,
-            author=author
-        )
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    follows.follow_many(request.user, [author.pk])
     return redirect('posts:follow_index')
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    if Follow.objects.filter(user=request.user, author=author).exists():
-        new_unfollowing = get_object_or_404(
-            Follow.objects,
-            user=request.user,
-            author=author
-        )
-        new_unfollowing.delete()
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    follows.unfollow_many(request.user, [author.pk])
     return redirect('posts:follow_index')
+
+
+@require_POST
+@login_required
+def follow_batch(request):
+    """Подписка или отписка от нескольких авторов за один запрос:
+    POST authors=<username>&authors=…&action=follow|unfollow."""
+    usernames = request.POST.getlist('authors')
+    action = request.POST.get('action', 'follow')
+    if action not in ('follow', 'unfollow'):
+        return JsonResponse({'error': 'action: follow или unfollow'},
+                            status=400)
+    if len(usernames) > settings.FOLLOW_BATCH_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {settings.FOLLOW_BATCH_LIMIT} авторов'},
+            status=400,
+        )
+    authors = dict(
+        User.objects.filter(username__in=usernames)
+        .values_list('pk', 'username')
+    )
+    if action == 'follow':
+        changed = follows.follow_many(request.user, authors)
+    else:
+        changed = follows.unfollow_many(request.user, authors)
+    return JsonResponse({
+        'action': action,
+        'changed': [authors[pk] for pk in changed],
+        'unknown': sorted(set(usernames) - set(authors.values())),
+    })
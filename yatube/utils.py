@@ -1,10 +1,114 @@
 from django.conf import settings
 
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+CURSOR_SEPARATOR = '|'
 
-def pagination(query, request):
+
+def encode_cursor(obj, field):
+    value = getattr(obj, field).isoformat()
+    return urlsafe_base64_encode(
+        force_bytes(f'{value}{CURSOR_SEPARATOR}{obj.pk}')
+    )
+
+
+def decode_cursor(cursor):
+    """Возвращает пару (значение поля, id) или None для битого курсора."""
+    try:
+        value, pk = force_text(
+            urlsafe_base64_decode(cursor)
+        ).rsplit(CURSOR_SEPARATOR, 1)
+        value, pk = parse_datetime(value), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу (field, id) без COUNT и OFFSET.
+
+    Страница выбирается условием относительно курсора соседней
+    страницы, поэтому время ответа не зависит от глубины листания.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        super().__init__(object_list, per_page)
+        self.field = field
+
+    def _keyset(self, value, pk, lookup):
+        # Одно OR SQLite не использует как диапазон по индексу
+        # (field, id); граница field <= value (>=) сужает поиск
+        return Q(**{f'{self.field}__{lookup}e': value}) & (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def keyset_page(self, after=None, before=None):
+        newest_first = (f'-{self.field}', '-pk')
+        oldest_first = (self.field, 'pk')
+        query = self.object_list
+        if before is not None:
+            query = query.filter(self._keyset(*before, 'gt'))
+            query = query.order_by(*oldest_first)
+        else:
+            if after is not None:
+                query = query.filter(self._keyset(*after, 'lt'))
+            query = query.order_by(*newest_first)
+        object_list = list(query[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if before is not None:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after is not None
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = encode_cursor(object_list[-1], self.field)
+        if object_list and has_previous:
+            previous_cursor = encode_cursor(object_list[0], self.field)
+        return Page(object_list, 1, self), next_cursor, previous_cursor
+
+
+def keyset_pagination(query, request, field='pub_date'):
+    paginator = KeysetPaginator(query, settings.POSTS_ON_PAGE, field)
+    page_obj, next_cursor, previous_cursor = paginator.keyset_page(
+        after=decode_cursor(request.GET.get('after', '')),
+        before=decode_cursor(request.GET.get('before', '')),
+    )
+    return {
+        'paginator': paginator,
+        'page_number': None,
+        'page_obj': page_obj,
+        'keyset': True,
+        'next_cursor': next_cursor,
+        'previous_cursor': previous_cursor,
+    }
+
+
+def pagination(query, request, keyset=False, count=None):
+    """Постраничный вывод записей.
+
+    Представления, передающие keyset=True, листаются по курсору, если
+    это включено в settings.KEYSET_PAGINATION. Явный ?page=N
+    по-прежнему обслуживается нумерованным Paginator; известное заранее
+    число записей count избавляет его от запроса COUNT.
+    """
+    if (
+        keyset
+        and settings.KEYSET_PAGINATION
+        and 'page' not in request.GET
+    ):
+        return keyset_pagination(query, request)
     paginator = Paginator(query, settings.POSTS_ON_PAGE)
+    if count is not None:
+        paginator.count = count
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return {
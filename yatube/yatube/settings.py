@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,18 +60,32 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db_router.PinToPrimaryMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Замеры запросов по имени URL: заголовок Server-Timing и /metrics/
+# для Prometheus. При False middleware исключается из цепочки
+REQUEST_METRICS = os.environ.get('YATUBE_REQUEST_METRICS', '1') == '1'
+SERVER_TIMING = True
+
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
+        'APP_DIRS': False,
         'OPTIONS': {
+            # Шаблоны разбираются один раз на процесс: {% include %}
+            # и {% extends %} не читают файлы на каждом запросе
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -81,19 +97,64 @@ TEMPLATES = [
     },
 ]
 
+# Только WSGI: ASGI и асинхронные представления появляются в Django
+# 3.0/3.1, а проект закреплён на 2.2 (тесты требуют Django < 3.0).
+# Переход отложен до обновления Django.
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Сколько секунд держать соединение между запросами; 0 — закрывать
+# после каждого запроса
+CONN_MAX_AGE = int(os.environ.get('YATUBE_CONN_MAX_AGE', 60))
+# Проверять оставшееся соединение в начале запроса (core.connections)
+CONN_HEALTH_CHECKS = True
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
     }
 }
 
+# Реплики только для чтения: пути к файлам SQLite через os.pathsep.
+# Локально их наполняет manage.py sync_replicas.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(os.pathsep)),
+    start=1,
+):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# PRAGMA для каждого нового соединения SQLite (core.backends.sqlite3).
+# WAL позволяет читать во время записи; busy_timeout — сколько
+# миллисекунд ждать блокировку, прежде чем вернуть SQLITE_BUSY.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'busy_timeout': 5000,
+}
+# Повторы представлений на запись при SQLITE_BUSY и начальная пауза, с
+SQLITE_BUSY_RETRIES = 5
+SQLITE_BUSY_BACKOFF = 0.05
+
+# Сколько секунд после записи клиент читает с основной базы
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'pin_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -128,12 +189,71 @@ USE_L10N = True
 USE_TZ = True
 
 # CASHES
+# Кэш по умолчанию файловый: его делят все процессы gunicorn на сервере.
+# YATUBE_CACHE=locmem возвращает кэш в память каждого процесса.
+CACHE_BACKENDS = {
+    'file': {
+        'BACKEND': 'core.cache.InstrumentedFileBasedCache',
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_DIR',
+            os.path.join(tempfile.gettempdir(), 'yatube_cache')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'locmem': {
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
+    },
+}
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': CACHE_BACKENDS[os.getenv('YATUBE_CACHE', 'file')],
 }
 
+# Запросы дольше SLOW_QUERY_MS миллисекунд с планом EXPLAIN пишутся
+# в SLOW_QUERY_LOG; сводка — manage.py slow_queries. 0 отключает журнал
+SLOW_QUERY_MS = float(os.environ.get('YATUBE_SLOW_QUERY_MS', 100))
+SLOW_QUERY_EXPLAIN = True
+SLOW_QUERY_LOG = os.getenv(
+    'YATUBE_SLOW_QUERY_LOG',
+    os.path.join(tempfile.gettempdir(), 'yatube_slow_queries.log')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'core.slow_queries.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Время жизни кэшированных фрагментов страниц; актуальность после
+# записи обеспечивают счётчики поколений posts.versions
+FRAGMENT_CACHE_TIMEOUT = 300
+# Карточки постов кэшируются по версии содержимого (posts.cards),
+# поэтому хранятся дольше фрагментов страниц
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
@@ -150,5 +270,58 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:posts_main'
 
 POSTS_ON_PAGE = 10
+# Комментариев на странице поста и в каждой подгрузке
+COMMENTS_ON_PAGE = 20
+
+# Листание лент по курсору (pub_date, id) вместо COUNT/OFFSET
+KEYSET_PAGINATION = True
+
+# Лента подписок: авторам с большим числом подписчиков посты
+# не раскладываются по лентам, их читатели собирают ленту при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL_POSTS = 100
+# Авторов в одном запросе posts:follow_batch
+FOLLOW_BATCH_LIMIT = 100
+
+# Рекомендации подписок (posts.suggestions): сколько хранить и
+# показывать, веса друзей друзей и совместных подписок; общие
+# подписки на авторов с большей аудиторией не делают читателей похожими
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_SHOWN = 5
+SUGGESTION_WEIGHTS = {'friends': 1.0, 'similarity': 2.0}
+SUGGESTION_HUB_FOLLOWERS = 1000
+SUGGESTION_SIMILAR_USERS = 50
+
+# Популярное (posts.trending): вклад активности вдвое слабеет за
+# TRENDING_HALF_LIFE секунд; хранится TRENDING_SIZE лучших постов и групп
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_WEIGHTS = {'comment': 1.0, 'follow': 3.0}
+TRENDING_SIZE = 200
+TRENDING_POSTS_SHOWN = 10
+TRENDING_GROUPS_SHOWN = 5
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Миниатюры картинок постов создаются в фоне после сохранения поста;
+# шаблоны только ищут готовые (posts.templatetags.post_images)
+THUMBNAIL_BACKEND = 'posts.thumbnails.LookupThumbnailBackend'
+POST_THUMBNAILS = [
+    ('960x339', {'crop': 'center', 'upscale': True}),
+]
+THUMBNAIL_PREGENERATE = True
+THUMBNAIL_WORKERS = 2
+
+# Загрузка картинок: файл больше лимита отбрасывается по мере приёма,
+# не попадая ни в память, ни на диск; огромные исходники уменьшаются
+# фоновой задачей posts.thumbnails
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploadhandlers.SizeLimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_SIDE = 2560
+
+TEST_RUNNER = 'core.test_runner.IsolatedTestRunner'
@@ -4,10 +4,14 @@ from django.conf.urls.static import static
 
 from django.urls import include, path
 
+from core import views as core_views
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('health/db/', core_views.db_connections, name='db_connections'),
+    path('metrics/', core_views.request_metrics, name='metrics'),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
 ]